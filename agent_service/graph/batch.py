@@ -0,0 +1,125 @@
+"""
+Batch screening for long lists of queries (e.g. theme × region × size grids).
+
+Instead of running the graph once per query:
+
+  1. duplicates (same normalized text) are collapsed and parsed once;
+  2. the unique queries are clarified concurrently;
+  3. every resulting `keyword_query | theme` text goes out in one batched
+     embeddings request (`aembed_many`);
+  4. searches run concurrently over the shared retrieval client.
+
+Results are yielded per input query as soon as each one is final, so a
+caller can stream them back.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable
+
+from .state import InvestorState
+from .result_cache import normalize_query
+from .metrics import instrument_node
+from .nodes.clarifier import clarifier
+from .nodes.query_fix import prepare_query
+from .nodes.retriever import retriever
+from ingestor.embed import aembed_many
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+
+_parse = instrument_node("Parser", clarifier)
+_retrieve = instrument_node("Retriever", retriever)
+
+
+def _results(queries: list[str], indices: list[int], state: InvestorState, error: Any = None) -> list[dict]:
+    return [
+        {
+            "index": i,
+            "query": queries[i],
+            "structured_query": state.structured_query,
+            "need_clarification": state.need_clarification,
+            "theme_suggestions": state.theme_suggestions,
+            "retrieved_docs": state.retrieved_docs,
+            "error": error if error is not None else state.error,
+        }
+        for i in indices
+    ]
+
+
+async def _completed(tasks: dict[str, Awaitable]) -> AsyncIterator[tuple[str, Any]]:
+    """Yield (key, result or exception) in completion order."""
+
+    async def keyed(key: str, awaitable: Awaitable):
+        try:
+            return key, await awaitable
+        except Exception as exc:
+            return key, exc
+
+    for next_done in asyncio.as_completed([keyed(k, a) for k, a in tasks.items()]):
+        yield await next_done
+
+
+async def run_batch(queries: list[str], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[dict]:
+    """Screen `queries`; yields one result dict per input query, in completion order."""
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise ValueError(f"At most {BATCH_MAX_QUERIES} queries per batch.")
+
+    groups: dict[str, list[int]] = {}
+    for i, query in enumerate(queries):
+        groups.setdefault(normalize_query(query), []).append(i)
+    states = {key: InvestorState(user_query=queries[idx[0]]) for key, idx in groups.items()}
+    logger.info("Batch of %d queries, %d unique", len(queries), len(groups))
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(node, state: InvestorState) -> InvestorState:
+        async with semaphore:
+            return await node(state)
+
+    # ── 1. clarify ─────────────────────────────────────────────────────
+    texts: dict[str, str] = {}
+    async for key, outcome in _completed({k: bounded(_parse, s) for k, s in states.items()}):
+        state = states[key]
+        if isinstance(outcome, Exception):
+            for row in _results(queries, groups[key], state, str(outcome)):
+                yield row
+            continue
+        states[key] = state = outcome
+        if state.need_clarification:
+            for row in _results(queries, groups[key], state):
+                yield row
+            continue
+        try:
+            texts[key] = prepare_query(state)
+        except ValueError as exc:
+            for row in _results(queries, groups[key], state, str(exc)):
+                yield row
+
+    if not texts:
+        return
+
+    # ── 2. embed, one batched request ──────────────────────────────────
+    to_embed = {k: t for k, t in texts.items() if t}
+    try:
+        vectors = await aembed_many(list(to_embed.values()))
+    except Exception as exc:
+        logger.exception("Batch embedding failed")
+        for key in texts:
+            for row in _results(queries, groups[key], states[key], str(exc)):
+                yield row
+        return
+    for key, vector in zip(to_embed, vectors):
+        states[key].near_vector = vector
+
+    # ── 3. retrieve, concurrently ──────────────────────────────────────
+    async for key, outcome in _completed({k: bounded(_retrieve, states[k]) for k in texts}):
+        error = str(outcome) if isinstance(outcome, Exception) else None
+        state = states[key] if error else outcome
+        for row in _results(queries, groups[key], state, error):
+            yield row
@@ -0,0 +1,144 @@
+"""
+In-process BM25 over `summary`, plus relative-score fusion.
+
+Follows the shape of the retriever's Weaviate query (`hybrid` on `summary`,
+alpha=0.7, `HybridFusion.RELATIVE_SCORE`); scores are not checked against
+Weaviate's and may differ in detail:
+
+  • `summary` is tokenized like its schema in index_setup/create_index.py
+    (WHITESPACE: split on whitespace, case kept); other fields fall back to
+    WORD tokenization (alphanumeric runs, lower-cased);
+  • BM25 with k1=1.2, b=0.75 and idf = ln(1 + (N-n+0.5)/(n+0.5)). N, n and
+    the average document length all come from the whole corpus; a filter
+    only limits which documents are scored;
+  • relative-score fusion min-max normalizes each result set to [0, 1] and
+    sums them weighted by alpha (vector) and 1-alpha (keyword).
+
+Postings are stored CSR-style (one int32 doc-id array and one float32 tf
+array per field), so scoring a query is a handful of NumPy gathers.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+K1 = 1.2
+B  = 0.75
+
+
+def tokenize_whitespace(text: str) -> list[str]:
+    return text.split()
+
+
+def tokenize_word(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+FIELD_TOKENIZERS: dict[str, Callable[[str], list[str]]] = {
+    "summary": tokenize_whitespace,
+}
+
+
+class _FieldIndex:
+    def __init__(self, texts: list[str], tokenize: Callable[[str], list[str]]):
+        self.tokenize = tokenize
+        self.n_docs = len(texts)
+        self.doc_len = np.zeros(self.n_docs, dtype=np.float32)
+
+        term_docs: dict[str, dict[int, int]] = {}
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text or "")
+            self.doc_len[doc_id] = len(tokens)
+            for tok in tokens:
+                counts = term_docs.setdefault(tok, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        self.vocab: dict[str, int] = {}
+        indptr = [0]
+        ids: list[int] = []
+        tfs: list[int] = []
+        for term_id, (term, counts) in enumerate(term_docs.items()):
+            self.vocab[term] = term_id
+            ids.extend(counts.keys())
+            tfs.extend(counts.values())
+            indptr.append(len(ids))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.doc_ids = np.array(ids, dtype=np.int32)
+        self.tf = np.array(tfs, dtype=np.float32)
+
+        # corpus-wide statistics, fixed at build time
+        df = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+        avgdl = float(self.doc_len.mean()) if self.n_docs else 0.0
+        self.norm = K1 * (1 - B + B * self.doc_len / (avgdl or 1.0))
+
+    def score(self, query: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(self.tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            ids, tf = self.doc_ids[lo:hi], self.tf[lo:hi]
+            if mask is not None:
+                keep = mask[ids]
+                ids, tf = ids[keep], tf[keep]
+            if ids.size:
+                scores[ids] += self.idf[term_id] * tf * (K1 + 1) / (tf + self.norm[ids])
+        return scores
+
+
+class BM25Index:
+    def __init__(self, props: list[dict], fields: Iterable[str] = ("summary",)):
+        self.fields: dict[str, _FieldIndex] = {}
+        for field in fields:
+            texts = [_as_text(p.get(field)) for p in props]
+            self.fields[field] = _FieldIndex(texts, FIELD_TOKENIZERS.get(field, tokenize_word))
+
+    def score(
+        self,
+        query: str,
+        properties: Iterable[str] = ("summary",),
+        mask: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """BM25 score of every doc for `query`, summed over `properties`."""
+        total = None
+        for field in properties:
+            s = self.fields[field].score(query, mask)
+            total = s if total is None else total + s
+        if total is None:
+            raise ValueError("No properties to score.")
+        if mask is not None:
+            total[~mask] = 0.0
+        return total
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return value or ""
+
+
+def relative_score_fusion(
+    vector_hits: dict[int, float],
+    keyword_hits: dict[int, float],
+    alpha: float,
+) -> dict[int, float]:
+    """
+    Weaviate's RELATIVE_SCORE fusion: min-max normalize each result set to
+    [0, 1] (a set whose scores are all equal normalizes to 1), then
+    fused = alpha * vector + (1 - alpha) * keyword. Missing entries count 0.
+    """
+    fused: dict[int, float] = {}
+    for hits, weight in ((vector_hits, alpha), (keyword_hits, 1 - alpha)):
+        if not hits or weight == 0:
+            continue
+        lo, hi = min(hits.values()), max(hits.values())
+        span = hi - lo
+        for doc_id, score in hits.items():
+            norm = (score - lo) / span if span > 0 else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * norm
+    return fused
@@ -4,9 +4,11 @@ from langgraph.graph import StateGraph, END
 from langfuse.langchain import CallbackHandler
 
 from .state import InvestorState
+from .metrics import instrument_node
 from .nodes.clarifier import clarifier
 from .nodes.query_fix import query_fix
 from .nodes.retriever import retriever
+from .nodes.speculative import SPECULATIVE_RETRIEVAL, speculative_parser
 
 # Initialize Langfuse
 from langfuse import get_client
@@ -27,14 +29,15 @@ def build_engine():
     """Compile and return the partial LangGraph engine."""
     graph = StateGraph(InvestorState)
 
-    graph.add_node("Parser", clarifier)
-    graph.add_node("Enricher", query_fix)
-    graph.add_node("Retriever", retriever)
+    parser = speculative_parser if SPECULATIVE_RETRIEVAL else clarifier
+    graph.add_node("Parser", instrument_node("Parser", parser))
+    graph.add_node("Enricher", instrument_node("Enricher", query_fix))
+    graph.add_node("Retriever", instrument_node("Retriever", retriever))
     
     graph.set_entry_point("Parser")
     graph.add_conditional_edges(
         "Parser",
-        lambda s: "Enricher" if not s.need_clarification else END
+        lambda s: "Enricher" if not (s.need_clarification or s.speculative_hit) else END
     )
     graph.add_edge("Enricher", "Retriever")
     graph.add_edge("Retriever", END)
@@ -0,0 +1,114 @@
+"""
+Full company records for `/company/{ticker}`.
+
+Search results carry only list-view properties (RETRIEVAL_RETURN_PROPERTIES);
+the long `description`, `keywords` etc. are fetched here on demand. Records
+are cached (`detail_cache`, cleared with the corpus version), and concurrent
+misses are coalesced: every ticker requested within DETAIL_BATCH_WINDOW_S
+goes to Weaviate in one `fetch_objects` by object id.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+from .local_index import aget_local_index
+from .metrics import track
+from .result_cache import detail_cache, refresh_corpus_version, search_cache
+from .nodes.retriever import COLLECTION_NAME, RETRIEVAL_BACKEND, _get_client
+
+logger = logging.getLogger(__name__)
+
+DETAIL_BATCH_WINDOW_S = float(os.getenv("DETAIL_BATCH_WINDOW_S", "0.005"))
+DETAIL_BATCH_MAX      = int(os.getenv("DETAIL_BATCH_MAX", "100"))
+
+
+def object_id(ticker: str) -> str:
+    """Weaviate UUID of a ticker's object (same scheme as `ingestor.ingest.object_id`)."""
+    return generate_uuid5(ticker.replace(".", "_"))
+
+
+async def _fetch(tickers: list[str]) -> dict[str, dict]:
+    collection = (await _get_client()).collections.get(COLLECTION_NAME)
+    await refresh_corpus_version(collection)
+    async with track("weaviate", "fetch_details"):
+        response = await collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any([object_id(t) for t in tickers]),
+            limit=len(tickers),
+        )
+    ids = {object_id(t): t for t in tickers}
+    return {ids[str(obj.uuid)]: dict(obj.properties) for obj in response.objects if str(obj.uuid) in ids}
+
+
+class _Batcher:
+    """Collects tickers for DETAIL_BATCH_WINDOW_S (or DETAIL_BATCH_MAX), then fetches them at once."""
+
+    def __init__(self):
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def get(self, ticker: str) -> Optional[dict]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(ticker, []).append(future)
+        if len(self._pending) >= DETAIL_BATCH_MAX:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._after_window())
+        return await future
+
+    async def _after_window(self) -> None:
+        await asyncio.sleep(DETAIL_BATCH_WINDOW_S)
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        if pending:
+            task = asyncio.create_task(self._resolve(pending))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _resolve(self, pending: dict[str, list[asyncio.Future]]) -> None:
+        try:
+            found = await _fetch(list(pending))
+        except Exception as exc:
+            found, error = {}, exc
+        else:
+            error = None
+            logger.info("Fetched %d of %d company records", len(found), len(pending))
+        for ticker, futures in pending.items():
+            for f in futures:
+                if f.done():
+                    continue
+                if error is not None:
+                    f.set_exception(error)
+                else:
+                    f.set_result(found.get(ticker))
+
+
+_batcher = _Batcher()
+
+
+async def company_details(ticker: str) -> Optional[dict]:
+    """Every stored property of `ticker`, or None when it is not in the corpus."""
+    if RETRIEVAL_BACKEND == "local":
+        index, reloaded = await aget_local_index()
+        if reloaded:
+            search_cache.clear()
+        rows = index.clause_rows(("ticker", "equal", ticker.replace(".", "_")))
+        return index.doc(int(rows[0])) if len(rows) else None
+
+    cached = detail_cache.get(ticker)
+    if cached is not None:
+        return cached
+    doc = await _batcher.get(ticker)
+    if doc is not None:
+        detail_cache.set(ticker, doc)
+    return doc
@@ -0,0 +1,374 @@
+"""
+Deterministic fast-path parser for screening queries.
+
+Handles the common, simple requests ("cybersecurity SIEM companies with over
+$500M EBITDA in Germany") without a GPT-4o round trip. Every parse carries a
+confidence score; the clarifier only trusts it above FAST_PARSE_MIN_CONFIDENCE
+and falls back to the LLM otherwise.
+
+Measure hit rate and agreement with the LLM on a query log:
+
+    python -m agent_service.graph.fast_parser evaluate queries.jsonl
+
+Each log line is {"query": "...", "llm": {...StructuredQuery...}}; lines
+without "llm" are re-parsed with GPT-4o when --llm is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from agent_service.theme_taxonomy import THEMES, PARENT_THEME
+from agent_service.sector_taxonomy import SECTOR_SUBSECTOR_MAP
+from .structured_query import StructuredQuery
+
+FAST_PARSE_ENABLED        = os.getenv("FAST_PARSE_ENABLED", "true").lower() == "true"
+FAST_PARSE_MIN_CONFIDENCE = float(os.getenv("FAST_PARSE_MIN_CONFIDENCE", "0.75"))
+FAST_PARSE_LOG            = os.getenv("FAST_PARSE_LOG")   # JSONL of LLM parses, for evaluation
+
+# ─── lexicon ──────────────────────────────────────────────────────────────
+# Curated phrases on top of the fragments derived from the theme names.
+THEME_ALIASES = {
+    "telehealth": "Virtual Care & Digital Health",
+    "telemedicine": "Virtual Care & Digital Health",
+    "oncology": "Precision Oncology & Genomic Diagnostics",
+    "genomics": "Precision Oncology & Genomic Diagnostics",
+    "liquid biopsy": "Precision Oncology & Genomic Diagnostics",
+    "medtech": "Medical Imaging & Devices",
+    "medical devices": "Medical Imaging & Devices",
+    "clinical trials": "CRO & Clinical Services",
+    "cro": "CRO & Clinical Services",
+    "ai agents": "Agentic AI Platforms",
+    "rpa": "RPA & Process Automation",
+    "itsm": "Digital Workflow & ITSM",
+    "crm": "CRM / Customer 360 Platforms",
+    "data warehouse": "Data Cloud / Warehouse & Sharing",
+    "observability": "Observability, Monitoring & Logging",
+    "vector database": "Search / Vector DB / Search AI",
+    "enterprise search": "Search / Vector DB / Search AI",
+    "xdr": "Endpoint & Workload Protection / XDR",
+    "edr": "Endpoint & Workload Protection / XDR",
+    "endpoint security": "Endpoint & Workload Protection / XDR",
+    "sase": "Cloud & Network Security / SASE",
+    "zero trust": "Cloud & Network Security / SASE",
+    "network security": "Cloud & Network Security / SASE",
+    "cloud security": "Cloud & Network Security / SASE",
+    "siem": "Security Analytics / SIEM / SOAR",
+    "soar": "Security Analytics / SIEM / SOAR",
+    "solar inverters": "Solar Inverters & Home Energy Systems",
+    "microinverters": "Solar Inverters & Home Energy Systems",
+    "battery storage": "Energy Storage Solutions",
+    "energy storage": "Energy Storage Solutions",
+    "energy management": "Energy Management Software",
+    "ebos": "Solar/Battery EBOS Components",
+    "ev charging": "EV Charging Infrastructure",
+    "charging stations": "EV Charging Infrastructure",
+    "esg": "ESG & Sustainability Analytics",
+    "bnpl": "BNPL & Alternative Consumer Finance",
+    "buy now pay later": "BNPL & Alternative Consumer Finance",
+    "edtech": "EdTech & Language Learning",
+    "language learning": "EdTech & Language Learning",
+    "defense software": "Intelligence / Defense Software",
+    "govtech": "GovTech Suites (State/Local)",
+}
+
+# Theme-name fragments too generic to identify a theme on their own.
+_GENERIC = {
+    "platforms", "devices", "solutions", "components", "software", "services",
+    "suites", "search", "ai", "data", "sharing", "protection", "analytics",
+    "security", "systems", "infrastructure", "automation", "logging", "monitoring",
+    "clinical services", "alternative consumer finance", "state", "local",
+    "cloud", "solar", "battery", "intelligence",
+}
+
+COUNTRIES = {
+    "united states": "United States", "usa": "United States",
+    "america": "United States", "american": "United States",
+    "canada": "Canada", "canadian": "Canada", "mexico": "Mexico", "brazil": "Brazil",
+    "united kingdom": "United Kingdom", "uk": "United Kingdom", "britain": "United Kingdom",
+    "british": "United Kingdom", "ireland": "Ireland", "irish": "Ireland",
+    "germany": "Germany", "german": "Germany", "france": "France", "french": "France",
+    "netherlands": "Netherlands", "dutch": "Netherlands", "switzerland": "Switzerland",
+    "swiss": "Switzerland", "sweden": "Sweden", "swedish": "Sweden", "norway": "Norway",
+    "denmark": "Denmark", "danish": "Denmark", "finland": "Finland", "spain": "Spain",
+    "spanish": "Spain", "italy": "Italy", "italian": "Italy", "israel": "Israel",
+    "israeli": "Israel", "india": "India", "indian": "India", "china": "China",
+    "chinese": "China", "japan": "Japan", "japanese": "Japan", "south korea": "South Korea",
+    "korean": "South Korea", "taiwan": "Taiwan", "singapore": "Singapore",
+    "australia": "Australia", "australian": "Australia",
+}
+
+_UNITS = {  # → USD millions
+    "k": 1e-3, "thousand": 1e-3,
+    "m": 1.0, "mm": 1.0, "mn": 1.0, "million": 1.0,
+    "b": 1e3, "bn": 1e3, "billion": 1e3,
+    "t": 1e6, "tn": 1e6, "trillion": 1e6,
+}
+_METRICS = {
+    "ebitda": "ebitda_min",
+    "revenue": "revenue_min", "revenues": "revenue_min", "sales": "revenue_min",
+    "market cap": "market_cap_min", "market capitalization": "market_cap_min",
+    "valuation": "market_cap_min",
+}
+_COMPARATOR = r"(?:over|above|more than|greater than|at least|exceeding|>=?|≥|min(?:imum)?(?: of)?)"
+_AMOUNT = (r"\$?\s*(?P<num>\d+(?:[.,]\d+)*)\s*(?P<unit>"
+           + "|".join(sorted(_UNITS, key=len, reverse=True)) + r")?\b")
+_METRIC = "(?P<metric>" + "|".join(sorted(map(re.escape, _METRICS), key=len, reverse=True)) + ")"
+
+_MONEY_PATTERNS = [
+    # "over $1B EBITDA", "> 500m in revenue"
+    re.compile(_COMPARATOR + r"\s*" + _AMOUNT + r"\s*(?:in |of |usd )?" + _METRIC),
+    # "EBITDA over $1B", "market cap of at least $10bn"
+    re.compile(_METRIC + r"\s*(?:of\s*)?" + _COMPARATOR + r"\s*" + _AMOUNT),
+]
+_GROWTH_PATTERNS = [
+    re.compile(_COMPARATOR + r"?\s*(\d+(?:\.\d+)?)\s*%\s*\+?\s*(?:yoy |annual |revenue |arr |sales )*growth"),
+    re.compile(r"(?:(?:yoy|annual|revenue|arr|sales) )*(?:growth|growing)\s*(?:rate\s*)?(?:of\s*)?" + _COMPARATOR + r"?\s*(\d+(?:\.\d+)?)\s*%"),
+]
+_BUDGET_PATTERN = re.compile(r"(?:budget(?: of)?|invest(?:ing)?|allocate)\s*" + _AMOUNT)
+_NEGATION = re.compile(r"\b(?:not|no|except|excluding|exclude|without|other than|outside)\b")
+_NUMERIC = re.compile(r"\d|\$|%")
+_US = re.compile(r"\bU\.?S\.?(?:A\.?)?(?![\w])")   # case-sensitive: "us" is usually a pronoun
+
+_FILLER = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "for", "to", "with", "that",
+    "which", "who", "are", "is", "be", "by", "from", "at", "as", "their", "its",
+    "find", "show", "me", "list", "give", "get", "search", "screen", "looking",
+    "look", "want", "i", "we", "please", "any", "some", "all", "top", "best",
+    "companies", "company", "firms", "firm", "stocks", "stock", "businesses",
+    "names", "players", "based", "headquartered", "located", "operating",
+    "over", "above", "strong", "high", "large", "big", "leading",
+    "like", "us", "our", "similar", "doing", "do", "does", "make", "making",
+    "focused", "focus", "exposure", "exposed", "space", "sector", "industry",
+    "related", "involved", "working", "provide", "providing", "offer", "offering",
+}
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[-_]", " ", text.lower())).strip()
+
+
+def _build_theme_lexicon() -> dict[str, str]:
+    lexicon: dict[str, str] = {}
+    for theme in THEMES:
+        lexicon[_norm(theme)] = theme
+        for frag in re.split(r"\s*(?:&|/|,|\(|\))\s*", theme):
+            frag = _norm(frag)
+            if frag and frag not in _GENERIC and len(frag) > 2:
+                # a fragment shared by several themes is ambiguous; drop it
+                lexicon[frag] = theme if lexicon.get(frag, theme) == theme else ""
+    lexicon.update({_norm(k): v for k, v in THEME_ALIASES.items()})
+    return {k: v for k, v in lexicon.items() if v}
+
+
+def _build_parent_lexicon() -> dict[str, str]:
+    lexicon: dict[str, str] = {}
+    for parent in set(PARENT_THEME.values()):
+        lexicon[_norm(parent)] = parent
+        for frag in re.split(r"\s*(?:&|,)\s*", parent):
+            frag = _norm(frag)
+            if frag and frag not in _GENERIC:
+                lexicon.setdefault(frag, parent)
+    return lexicon
+
+
+def _build_sector_lexicon() -> dict[str, str]:
+    lexicon: dict[str, str] = {}
+    for sector, subsectors in SECTOR_SUBSECTOR_MAP.items():
+        for sub in subsectors:
+            lexicon.setdefault(_norm(sub), sector)
+        lexicon[_norm(sector)] = sector
+    return lexicon
+
+
+THEME_LEXICON  = _build_theme_lexicon()
+PARENT_LEXICON = _build_parent_lexicon()
+SECTOR_LEXICON = _build_sector_lexicon()
+CHILDREN = {p: [t for t, pp in PARENT_THEME.items() if pp == p] for p in set(PARENT_THEME.values())}
+
+
+def _find_phrases(text: str, lexicon: dict[str, str]) -> list[tuple[str, str]]:
+    """Longest-first, non-overlapping phrase matches as (phrase, value)."""
+    found = []
+    for phrase in sorted(lexicon, key=len, reverse=True):
+        pattern = r"(?<![\w])" + re.escape(phrase) + r"(?![\w])"
+        if re.search(pattern, text):
+            found.append((phrase, lexicon[phrase]))
+            text = re.sub(pattern, " ", text)
+    return found
+
+
+def _amount(number: str, unit: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    if unit:
+        return value * _UNITS[unit]
+    # bare numbers are USD millions unless they are obviously whole dollars
+    return value / 1e6 if value >= 100_000 else value
+
+
+# ─── parser ───────────────────────────────────────────────────────────────
+@dataclass
+class FastParse:
+    structured: dict
+    confidence: float
+    matched: dict = field(default_factory=dict)
+
+    @property
+    def accepted(self) -> bool:
+        return self.confidence >= FAST_PARSE_MIN_CONFIDENCE
+
+
+def fast_parse(query: str) -> FastParse:
+    """Parse `query` with rules only; never raises on odd input."""
+    text = _norm(query)
+    rest = text
+    fields: dict = {}
+    matched: dict = {}
+
+    # numeric thresholds first, so their words don't leak into keywords
+    for pattern in _MONEY_PATTERNS:
+        for m in pattern.finditer(text):
+            fields[_METRICS[m["metric"]]] = _amount(m["num"], m["unit"])
+            rest = rest.replace(m.group(0), " ")
+    for pattern in _GROWTH_PATTERNS:
+        for m in pattern.finditer(text):
+            fields["rev_growth_min"] = float(m.group(1))
+            rest = rest.replace(m.group(0), " ")
+    m = _BUDGET_PATTERN.search(rest)
+    if m:
+        fields["budget"] = _amount(m["num"], m["unit"])
+        rest = rest.replace(m.group(0), " ")
+    unparsed_numbers = bool(_NUMERIC.search(rest))
+
+    countries = {v for _, v in _find_phrases(rest, COUNTRIES)}
+    for phrase in COUNTRIES:
+        rest = re.sub(r"(?<![\w.])" + re.escape(phrase) + r"(?![\w])", " ", rest)
+    if _US.search(query):
+        countries.add("United States")
+        rest = re.sub(r"\bu\.?s\.?(?:a\.?)?(?![\w])", " ", rest)
+    if len(countries) == 1:
+        fields["country"] = countries.pop()
+
+    themes = _find_phrases(rest, THEME_LEXICON)
+    parents = _find_phrases(rest, PARENT_LEXICON)
+    sectors = _find_phrases(rest, SECTOR_LEXICON)
+    matched.update(themes=themes, parents=parents, sectors=sectors)
+
+    theme_set = {t for _, t in themes}
+    # a lone parent ("cybersecurity") is still a clear intent: the clarifier's
+    # theme resolver narrows it to a child theme or offers its children
+    parent_only = not theme_set and len({p for _, p in parents}) == 1
+    if len(theme_set) == 1:
+        fields["theme"] = theme_set.pop()
+    elif parent_only:
+        children = CHILDREN[parents[0][1]]
+        if len(children) == 1:
+            fields["theme"] = children[0]
+    if len({s for _, s in sectors}) == 1:
+        fields["sector"] = sectors[0][1]
+
+    words = [w for w in re.findall(r"[a-z0-9][a-z0-9.+]*", rest) if w not in _FILLER]
+    explained = set()
+    for phrase, _ in themes + parents + sectors:
+        explained.update(phrase.split())
+    leftovers = [w for w in words if w not in explained]
+
+    fields["keyword_query"] = " ".join(words) or None
+    # one keyword per unexplained token; a parent phrase not captured as a theme is a keyword too
+    parent_keyword = parent_only and not fields.get("theme") and parents[0][0] not in dict(sectors)
+    keywords = leftovers + ([parents[0][0]] if parent_keyword else [])
+    fields["keywords"] = list(dict.fromkeys(keywords))
+
+    # ── confidence ───────────────────────────────────────────────────
+    confidence = 0.0
+    if fields.get("theme"):
+        confidence += 0.6
+    elif parent_only:
+        confidence += 0.4
+    confidence += 0.2 * (1 - len(leftovers) / max(len(words), 1))
+    confidence += 0.0 if unparsed_numbers else 0.2
+    if len(theme_set) > 1 or (not fields.get("theme") and len(countries) > 1):
+        confidence = min(confidence, 0.3)
+    if _NEGATION.search(text) or unparsed_numbers:
+        confidence = min(confidence, 0.2)
+
+    structured = StructuredQuery(**fields).model_dump()
+    return FastParse(structured=structured, confidence=round(confidence, 3), matched=matched)
+
+
+# ─── evaluation ───────────────────────────────────────────────────────────
+COMPARED_FIELDS = ("theme", "sector", "country", "ebitda_min", "revenue_min",
+                   "rev_growth_min", "market_cap_min")
+
+
+def log_llm_parse(query: str, structured: dict) -> None:
+    """Append an LLM parse to FAST_PARSE_LOG (if set) for later evaluation."""
+    if not FAST_PARSE_LOG:
+        return
+    with open(FAST_PARSE_LOG, "a") as f:
+        f.write(json.dumps({"query": query, "llm": structured}) + "\n")
+
+
+def evaluate(records: list[dict], threshold: float = FAST_PARSE_MIN_CONFIDENCE) -> dict:
+    """Hit rate of the fast path and its agreement with the LLM parses."""
+    hits = 0
+    exact = 0
+    per_field = {f: 0 for f in COMPARED_FIELDS}
+    for rec in records:
+        parse = fast_parse(rec["query"])
+        if parse.confidence < threshold:
+            continue
+        hits += 1
+        llm = rec["llm"]
+        same = [f for f in COMPARED_FIELDS if parse.structured.get(f) == llm.get(f)]
+        for f in same:
+            per_field[f] += 1
+        exact += len(same) == len(COMPARED_FIELDS)
+    n = len(records)
+    return {
+        "queries": n,
+        "threshold": threshold,
+        "hit_rate": hits / n if n else 0.0,
+        "exact_agreement": exact / hits if hits else 0.0,
+        "field_agreement": {f: c / hits if hits else 0.0 for f, c in per_field.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fast-path parser utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ev = sub.add_parser("evaluate", help="Hit rate / LLM agreement on a JSONL query log")
+    ev.add_argument("log_path")
+    ev.add_argument("--threshold", type=float, default=FAST_PARSE_MIN_CONFIDENCE)
+    ev.add_argument("--llm", action="store_true", help="Parse lines lacking 'llm' with GPT-4o")
+    pr = sub.add_parser("parse", help="Show the fast parse of one query")
+    pr.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        parse = fast_parse(args.query)
+        print(json.dumps({"confidence": parse.confidence, **parse.structured}, indent=2))
+        return
+
+    with open(args.log_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if args.llm:
+        from .nodes.clarifier import _extract
+
+        async def fill() -> None:
+            for rec in records:
+                if "llm" not in rec:
+                    rec["llm"] = await _extract(rec["query"])
+        asyncio.run(fill())
+    records = [r for r in records if "llm" in r]
+    print(json.dumps(evaluate(records, args.threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Filter-aware query planning.
+
+Each clause produced by `query_fix.filter_spec` is given a cardinality (how
+many objects it matches on its own). Clauses are ordered most selective
+first and the size of their AND is estimated assuming independence, capped
+by the smallest clause. Screens whose estimate is at most
+EXACT_SEARCH_MAX_OBJECTS skip the local index's approximate pass and are
+scored exactly. Weaviate makes the same call server-side, per the
+collection's flatSearchCutoff (see index_setup/create_index.py).
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any
+
+EXACT_SEARCH_MAX_OBJECTS = int(os.getenv("EXACT_SEARCH_MAX_OBJECTS", "500"))
+
+Clause = tuple[str, str, Any]
+
+
+@dataclass
+class FilterPlan:
+    spec: list[Clause]        # most selective clause first
+    counts: list[int]         # matches per clause, aligned with `spec`
+    total: int                # objects in the collection
+    estimate: int             # expected survivors of the AND
+
+    @property
+    def selectivity(self) -> float:
+        return self.estimate / self.total if self.total else 0.0
+
+    def describe(self) -> str:
+        clauses = ", ".join(f"{p} {op} {v!r}: {n}" for (p, op, v), n in zip(self.spec, self.counts))
+        return f"~{self.estimate}/{self.total} ({self.selectivity:.2%}) [{clauses}]"
+
+
+def plan(spec: list[Clause], counts: list[int], total: int) -> FilterPlan:
+    order = sorted(range(len(spec)), key=counts.__getitem__)
+    ordered_counts = [counts[i] for i in order]
+    if not spec:
+        estimate = total
+    elif total <= 0:
+        estimate = 0
+    else:
+        product = float(total)
+        for n in ordered_counts:
+            product *= n / total
+        estimate = min(ordered_counts[0], int(round(product)))
+    return FilterPlan([spec[i] for i in order], ordered_counts, total, estimate)
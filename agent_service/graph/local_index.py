@@ -0,0 +1,327 @@
+"""
+In-process vector + filter search over the ingested corpus.
+
+Loads the doc store (or the legacy `my_docs.json`) into NumPy arrays and
+answers the same questions the retriever sends to Weaviate: cosine top-k
+under the filter clauses produced by `query_fix.filter_spec`. Selected with
+RETRIEVAL_BACKEND=local; handy for tests and single-box deployments.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from .bm25 import BM25Index, relative_score_fusion
+from .filter_planner import EXACT_SEARCH_MAX_OBJECTS, Clause, FilterPlan, plan
+from ingestor.doc_store import (
+    DOC_STORE_PATH, INDEX_FILE, LEGACY_JSON_PATH, DocStore, has_vector, load_docs, store_exists,
+)
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SEARCH_MODE       = os.getenv("LOCAL_SEARCH_MODE", "exact")       # "exact" | "approx"
+LOCAL_APPROX_OVERSAMPLE = int(os.getenv("LOCAL_APPROX_OVERSAMPLE", "8"))
+LOCAL_RELOAD_CHECK_S    = float(os.getenv("CORPUS_VERSION_CHECK_S", "30"))
+HYBRID_CANDIDATES       = int(os.getenv("LOCAL_HYBRID_CANDIDATES", "100"))   # per sub-search
+
+NUMERIC_FIELDS = ("ebitda_musd", "rev_growth_pct", "market_cap_musd")
+TEXT_FIELDS    = ("country", "sector", "ticker")
+
+_NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first (partial selection, not a full sort)."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class LocalIndex:
+    def __init__(self, props: list[dict], vectors: np.ndarray):
+        self.props = props
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.has_vector = norms[:, 0] > 0
+        self.vectors = vectors / np.where(norms > 0, norms, 1.0)
+        # 1 bit per dimension, used by the approximate mode's first pass
+        self.codes = np.packbits(self.vectors > 0, axis=1)
+
+        self.numeric = {
+            f: np.array([_num(p.get(f)) for p in props], dtype=np.float64) for f in NUMERIC_FIELDS
+        }
+        self.text = {
+            f: np.array([(p.get(f) or "").lower() for p in props], dtype=object)
+            for f in TEXT_FIELDS
+        }
+        # range index: non-NaN values sorted ascending, with their rows
+        self.ranges: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for f, column in self.numeric.items():
+            order = np.argsort(column, kind="stable")          # NaN sorts last
+            valid = order[: int((~np.isnan(column)).sum())]
+            self.ranges[f] = (column[valid], valid)
+
+        self.postings: dict[str, dict[str, np.ndarray]] = {}
+        for f in ("themes", "keywords") + TEXT_FIELDS:
+            lists: dict[str, list[int]] = {}
+            for row, p in enumerate(props):
+                values = p.get(f) or []
+                for value in [values] if isinstance(values, str) else values:
+                    lists.setdefault(value.lower(), []).append(row)
+            self.postings[f] = {v: np.array(r, dtype=np.int64) for v, r in lists.items()}
+
+        self.bm25 = BM25Index(props)
+
+    def __len__(self) -> int:
+        return len(self.props)
+
+    # ── construction ───────────────────────────────────────────────────
+    @classmethod
+    def from_docs(cls, docs: list[dict]) -> "LocalIndex":
+        vectors = np.array(
+            [d["_vector"] if has_vector(d) else np.zeros(_dim(docs)) for d in docs], dtype=np.float32
+        ).reshape(len(docs), _dim(docs))
+        props = [{k: v for k, v in d.items() if not k.startswith("_") and k != "embed_text"}
+                 for d in docs]
+        return cls(props, vectors)
+
+    @classmethod
+    def load(cls, path: str = DOC_STORE_PATH) -> "LocalIndex":
+        if store_exists(path):
+            store = DocStore(path)
+            props = [{k: v for k, v in d.items() if not k.startswith("_") and k != "embed_text"}
+                     for d in store.docs(with_vector=False)]
+            index = cls(props, store.vectors)
+        else:
+            index = cls.from_docs(load_docs(path))
+        logger.info("Loaded local index with %d documents", len(index))
+        return index
+
+    # ── filtering ──────────────────────────────────────────────────────
+    def clause_rows(self, clause: Clause) -> np.ndarray:
+        """Sorted rows matching one `(property, operator, value)` clause, from its index."""
+        prop, op, value = clause
+        if op == "greater_than":
+            values, rows = self.ranges[prop]
+            return np.sort(rows[np.searchsorted(values, value, side="right"):])
+        if op == "equal":
+            return self.postings[prop].get(str(value).lower(), _NO_ROWS)
+        if op == "contains_any":
+            postings = self.postings[prop]
+            hits = [postings[v] for v in (str(x).lower() for x in value) if v in postings]
+            if len(hits) == 1:
+                return hits[0]
+            return np.unique(np.concatenate(hits)) if hits else _NO_ROWS
+        raise ValueError(f"Unsupported filter operator {op!r}")
+
+    def clause_count(self, clause: Clause) -> int:
+        prop, op, value = clause
+        if op == "greater_than":
+            values, _ = self.ranges[prop]
+            return int(values.size - np.searchsorted(values, value, side="right"))
+        return int(self.clause_rows(clause).size)
+
+    def plan(self, spec: list[Clause]) -> FilterPlan:
+        return plan(spec, [self.clause_count(c) for c in spec], len(self))
+
+    def _test(self, clause: Clause, rows: np.ndarray) -> np.ndarray:
+        prop, op, value = clause
+        if op == "greater_than":
+            return self.numeric[prop][rows] > value              # NaN compares False
+        if op == "equal":
+            return self.text[prop][rows] == str(value).lower()
+        return np.isin(rows, self.clause_rows(clause), assume_unique=True)
+
+    def rows(self, spec: list[Clause]) -> np.ndarray:
+        """
+        Rows passing all ANDed clauses. Starts from the most selective
+        clause's index and checks the others only on those rows.
+        """
+        if not spec:
+            return np.flatnonzero(self.has_vector)
+        ordered = self.plan(spec).spec
+        rows = self.clause_rows(ordered[0])
+        for clause in ordered[1:]:
+            if rows.size == 0:
+                break
+            rows = rows[self._test(clause, rows)]
+        return rows[self.has_vector[rows]]
+
+    def mask(self, spec: list[Clause]) -> np.ndarray:
+        """Boolean row mask for ANDed `(property, operator, value)` clauses."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.rows(spec)] = True
+        return mask
+
+    def count(self, spec: list[Clause]) -> int:
+        return int(self.rows(spec).size)
+
+    # ── search ─────────────────────────────────────────────────────────
+    def vector_scores(self, vector: list[float], rows: np.ndarray) -> np.ndarray:
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        return self.vectors[rows] @ q
+
+    def _search_rows(self, vector, rows: np.ndarray, limit: int, mode: str) -> list[tuple[int, float]]:
+        if rows.size == 0:
+            return []
+        # few survivors: exact scoring is cheaper than a shortlist pass
+        if mode == "approx" and rows.size > max(limit * LOCAL_APPROX_OVERSAMPLE, EXACT_SEARCH_MAX_OBJECTS):
+            # Hamming distance on sign bits picks a shortlist; exact cosine re-ranks it.
+            q = np.asarray(vector, dtype=np.float32)
+            q_code = np.packbits(q > 0)
+            hamming = np.unpackbits(self.codes[rows] ^ q_code, axis=1).sum(axis=1)
+            rows = rows[top_k(-hamming.astype(np.float32), limit * LOCAL_APPROX_OVERSAMPLE)]
+
+        scores = self.vector_scores(vector, rows)
+        best = top_k(scores, limit)
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def search(
+        self,
+        vector: list[float],
+        spec: Optional[list[Clause]] = None,
+        limit: int = 10,
+        mode: str = LOCAL_SEARCH_MODE,
+    ) -> list[tuple[int, float]]:
+        """Cosine top-`limit` among rows passing `spec`, as (row, similarity)."""
+        return self._search_rows(vector, self.rows(spec or []), limit, mode)
+
+    def hybrid(
+        self,
+        query: str,
+        vector: Optional[list[float]],
+        spec: Optional[list[Clause]] = None,
+        limit: int = 10,
+        alpha: float = 0.7,
+        properties: tuple[str, ...] = ("summary",),
+        mode: str = LOCAL_SEARCH_MODE,
+    ) -> list[tuple[int, float]]:
+        """
+        Keyword + vector search fused by relative score, like Weaviate's
+        `hybrid(..., fusion_type=HybridFusion.RELATIVE_SCORE)`.
+        Returns (row, fused score in [0, 1]) best first.
+        """
+        rows = self.rows(spec or [])
+        candidates = max(limit, HYBRID_CANDIDATES)
+
+        vector_hits: dict[int, float] = {}
+        if vector is not None and alpha > 0:
+            vector_hits = dict(self._search_rows(vector, rows, candidates, mode))
+
+        keyword_hits: dict[int, float] = {}
+        if query and alpha < 1:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[rows] = True
+            scores = self.bm25.score(query, properties, mask)
+            for i in top_k(scores, candidates):
+                if scores[i] <= 0:
+                    break
+                keyword_hits[int(i)] = float(scores[i])
+
+        fused = relative_score_fusion(vector_hits, keyword_hits, alpha)
+        ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:limit]
+
+    def doc(self, row: int) -> dict:
+        return dict(self.props[row])
+
+
+def filter_mask(props: list[dict], spec: list[Clause]) -> np.ndarray:
+    """
+    `LocalIndex.rows` semantics for a small, throw-away candidate set: each
+    clause is checked row by row instead of through prebuilt indexes.
+    """
+    mask = np.ones(len(props), dtype=bool)
+    for prop, op, value in spec:
+        if op == "greater_than":
+            keep = [_num(p.get(prop)) > value for p in props]          # NaN compares False
+        elif op == "equal":
+            keep = [str(p.get(prop) or "").lower() == str(value).lower() for p in props]
+        elif op == "contains_any":
+            wanted = {str(x).lower() for x in value}
+            keep = [
+                any(v.lower() in wanted for v in ([values] if isinstance(values, str) else values))
+                for values in (p.get(prop) or [] for p in props)
+            ]
+        else:
+            raise ValueError(f"Unsupported filter operator {op!r}")
+        mask &= np.array(keep, dtype=bool)
+    return mask
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _dim(docs: list[dict]) -> int:
+    return next((len(d["_vector"]) for d in docs if has_vector(d)), 1024)
+
+
+# ── process-wide instance ─────────────────────────────────────────────────
+_index: Optional[LocalIndex] = None
+_mtime: Optional[float] = None
+_checked = 0.0
+_reloading = False
+_lock = threading.Lock()
+
+
+def _store_mtime(path: str) -> Optional[float]:
+    for candidate in (os.path.join(path, INDEX_FILE), LEGACY_JSON_PATH):
+        if os.path.exists(candidate):
+            return os.path.getmtime(candidate)
+    return None
+
+
+def get_local_index(path: str = DOC_STORE_PATH) -> tuple[LocalIndex, bool]:
+    """
+    Return (index, reloaded). The store is re-checked at most every
+    CORPUS_VERSION_CHECK_S seconds and reloaded when an ingest rewrote it.
+    A reload is built outside the lock and swapped in whole, so other
+    callers keep searching the current index meanwhile; only the first
+    load makes them wait. Blocking – async code uses `aget_local_index`.
+    """
+    global _index, _mtime, _checked, _reloading
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and (_reloading or now - _checked < LOCAL_RELOAD_CHECK_S):
+            return _index, False
+        _checked = now
+        mtime = _store_mtime(path)
+        if _index is not None and mtime == _mtime:
+            return _index, False
+        if _index is None:
+            _index, _mtime = LocalIndex.load(path), mtime
+            return _index, True
+        current, _reloading = _index, True
+
+    try:
+        index = LocalIndex.load(path)
+    except Exception:
+        logger.exception("Reloading the local index failed; keeping the current one")
+        with _lock:
+            _reloading = False
+        return current, False
+    with _lock:
+        _index, _mtime, _reloading = index, mtime, False
+    return index, True
+
+
+async def aget_local_index(path: str = DOC_STORE_PATH) -> tuple[LocalIndex, bool]:
+    """`get_local_index` for the event loop: stat calls and (re)loads run in a worker thread."""
+    index = _index
+    if index is not None and (_reloading or time.monotonic() - _checked < LOCAL_RELOAD_CHECK_S):
+        return index, False
+    return await asyncio.to_thread(get_local_index, path)
@@ -0,0 +1,256 @@
+"""
+Lightweight in-process metrics, exposed in Prometheus text format.
+
+Counters and fixed-bucket histograms keyed by label tuples; recording one
+observation is a dict lookup, a bisect and two additions under a lock, so
+instrumentation costs a few microseconds per request. Covered:
+
+  • graph nodes      – latency and errors per node (`instrument_node`)
+  • upstream calls   – OpenAI chat / embeddings and Weaviate queries:
+                       latency, errors and token usage (`track`, `instrument_openai`)
+  • caches           – parse / search / company-detail / embedding hit counts,
+                       read from the caches themselves at scrape time
+  • HTTP endpoints   – request latency and status (`track_request` in main.py)
+  • coalescing       – leaders / followers per single-flight stage
+
+`render()` produces the `/metrics` payload.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Callable, Iterable, Optional
+
+from .result_cache import detail_cache, parse_cache, search_cache
+from ingestor.embed_cache import opened_cache
+
+PREFIX = "agentinvest"
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value:g}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS_S,
+    ):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # per label set: [count per bucket (+Inf last)], sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}"
+            base = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{base} {total:.6f}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+# ── metric definitions ────────────────────────────────────────────────────
+REQUEST_LATENCY  = Histogram("request_latency_seconds", "HTTP request latency.", ("endpoint",))
+REQUESTS         = Counter("requests_total", "HTTP requests by status code.", ("endpoint", "status"))
+NODE_LATENCY     = Histogram("node_latency_seconds", "Graph node latency.", ("node",))
+NODE_ERRORS      = Counter("node_errors_total", "Graph node exceptions.", ("node",))
+UPSTREAM_LATENCY = Histogram("upstream_latency_seconds", "Upstream call latency.", ("service", "op"))
+UPSTREAM_ERRORS  = Counter("upstream_errors_total", "Failed upstream calls.", ("service", "op"))
+TOKENS           = Counter("tokens_total", "OpenAI tokens consumed.", ("model", "kind"))
+PARSE_SOURCE     = Counter("parse_source_total", "How queries were parsed (cache / fast / llm).", ("source",))
+SPECULATION      = Counter("speculation_total", "Speculative retrieval outcomes.", ("outcome",))
+THEME_RESOLUTION = Counter("theme_resolution_total", "Local theme resolution outcomes.", ("outcome",))
+OPENAI_LIMITER_WAIT = Histogram(
+    "openai_limiter_wait_seconds", "Time OpenAI calls waited for rate-limit budget.", ("priority",),
+)
+OPENAI_RETRIES   = Counter("openai_retries_total", "Retried OpenAI calls.", ("model", "reason"))
+SINGLE_FLIGHT    = Counter(
+    "single_flight_total", "Coalescable calls: leaders ran the work, followers shared it.", ("stage", "role"),
+)
+
+METRICS = (
+    REQUEST_LATENCY, REQUESTS, NODE_LATENCY, NODE_ERRORS,
+    UPSTREAM_LATENCY, UPSTREAM_ERRORS, TOKENS, PARSE_SOURCE, SPECULATION,
+    THEME_RESOLUTION, SINGLE_FLIGHT, OPENAI_LIMITER_WAIT, OPENAI_RETRIES,
+)
+
+
+# ── instrumentation helpers ───────────────────────────────────────────────
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """Wrap an async graph node with latency / error recording."""
+
+    @functools.wraps(fn)
+    async def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return await fn(state)
+        except Exception:
+            NODE_ERRORS.inc(name)
+            raise
+        finally:
+            NODE_LATENCY.observe(time.perf_counter() - start, name)
+
+    return wrapper
+
+
+@asynccontextmanager
+async def track(service: str, op: str):
+    """Time one upstream call; exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(service, op)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, service, op)
+
+
+def record_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    TOKENS.inc(model, "prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    if completion:
+        TOKENS.inc(model, "completion", amount=completion)
+
+
+def _record_response(op: str, kwargs: dict, response) -> None:
+    record_usage(kwargs.get("model") or getattr(response, "model", "unknown"), getattr(response, "usage", None))
+
+
+def _wrap_create(create: Callable, op: str) -> Callable:
+    if inspect.iscoroutinefunction(create):
+        @functools.wraps(create)
+        async def wrapper(*args, **kwargs):
+            async with track("openai", op):
+                response = await create(*args, **kwargs)
+            _record_response(op, kwargs, response)
+            return response
+    else:
+        @functools.wraps(create)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = create(*args, **kwargs)
+            except Exception:
+                UPSTREAM_ERRORS.inc("openai", op)
+                raise
+            finally:
+                UPSTREAM_LATENCY.observe(time.perf_counter() - start, "openai", op)
+            _record_response(op, kwargs, response)
+            return response
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def instrument_openai(client):
+    """Record latency, errors and tokens for an OpenAI client's (async or sync) chat and embedding calls."""
+    for resource, op in ((client.chat.completions, "chat"), (client.embeddings, "embeddings")):
+        if not getattr(resource.create, "_instrumented", False):
+            resource.create = _wrap_create(resource.create, op)
+    return client
+
+
+def observe_request(endpoint: str, seconds: float, status: int) -> None:
+    REQUEST_LATENCY.observe(seconds, endpoint)
+    REQUESTS.inc(endpoint, status)
+
+
+@asynccontextmanager
+async def track_request(endpoint: str):
+    start = time.perf_counter()
+    status = 200
+    try:
+        yield
+    except Exception as exc:
+        status = getattr(exc, "status_code", 500)
+        raise
+    finally:
+        observe_request(endpoint, time.perf_counter() - start, status)
+
+
+# ── exposition ────────────────────────────────────────────────────────────
+def _cache_lines() -> Iterable[str]:
+    name = f"{PREFIX}_cache_requests_total"
+    yield f"# HELP {name} Cache lookups by result."
+    yield f"# TYPE {name} counter"
+    caches: list[tuple[str, Optional[object]]] = [
+        ("parse", parse_cache), ("search", search_cache),
+        ("company_detail", detail_cache),
+        ("embedding", opened_cache()),        # a scrape must not create the database
+    ]
+    for cache_name, cache in caches:
+        if cache is None:
+            continue
+        for result, value in (("hit", cache.hits), ("miss", cache.misses)):
+            yield f'{name}{{cache="{cache_name}",result="{result}"}} {value}'
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_cache_lines())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -2,16 +2,24 @@
 
 from __future__ import annotations
 
-import os
-from functools import lru_cache
-from dotenv import load_dotenv
-from openai import OpenAI
-import httpx
+import logging
+from typing import Optional
+
+from openai import AsyncOpenAI
 
 from ..state import InvestorState
 from ..structured_query import StructuredQuery
+from ..result_cache import parse_cache, normalize_query
+from ..fast_parser import FAST_PARSE_ENABLED, fast_parse, log_llm_parse
+from ..metrics import PARSE_SOURCE, THEME_RESOLUTION
+from ..single_flight import parse_flight
+from ..theme_resolver import THEME_RESOLVER_ENABLED, ThemeResolver, aget_theme_resolver
 from agent_service.theme_taxonomy import THEMES
 from agent_service.sector_taxonomy import SECTOR_SUBSECTOR_MAP
+from agent_service.resources import resources
+from ingestor.embed import aembed, embedding_model
+
+logger = logging.getLogger(__name__)
 
 # Build theme doc
 THEME_DOC = "\n".join(f"- {t}" for t in THEMES)
@@ -25,14 +33,9 @@ SECTOR_SUBSECTOR_MAP = "\n".join(f"- {k} → {', '.join(v)}" for k, v in SECTOR_
 JSON_SCHEMA = StructuredQuery.schema_json(indent=2)
 
 
-@lru_cache(maxsize=1)
-def _get_client() -> OpenAI:
-    """Return a cached OpenAI client loaded from the environment."""
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY environment variable is not set.")
-    return OpenAI(api_key=api_key, http_client=httpx.Client())
+def _get_client() -> AsyncOpenAI:
+    """Return the shared async OpenAI client."""
+    return resources.openai()
 
 # SYSTEM_PROMPT = (
 #     "You are an AI assistant that extracts a *StructuredQuery* object "
@@ -133,10 +136,91 @@ SYSTEM_PROMPT = (
     "{JSON_SCHEMA}"
 )
 
-def clarifier(state: InvestorState) -> InvestorState:
+async def clarifier(state: InvestorState) -> InvestorState:
     """Populate ``state`` with a structured query derived from the user text."""
+    cache_key = normalize_query(state.user_query)
+    structured = parse_cache.get(cache_key)
+    if structured is None:
+        # identical queries arriving together share one parse
+        structured = await parse_flight.do(cache_key, lambda: _parse(state.user_query, cache_key))
+    else:
+        PARSE_SOURCE.inc("cache")
+
+    if structured["theme"] is None and THEME_RESOLVER_ENABLED:
+        structured = await _resolve_theme(state, cache_key, structured)
+
+    state.structured_query = structured
+    # The user needs to provide at least one of sector or keywords. Otherwise, we need clarification.
+    state.need_clarification = (
+        #structured["keywords"] is None \
+        structured["theme"] is None
+    )
+    state.budget = structured.get("budget")
+    
+    return state
+
+
+async def _parse(user_query: str, cache_key: str) -> dict:
+    """Rules first; GPT-4o only when the fast path is not confident. Caches the result."""
+    fast = fast_parse(user_query) if FAST_PARSE_ENABLED else None
+    # a themeless parse (lone parent theme) is only good when the resolver can narrow it
+    if fast is not None and fast.accepted and fast.structured["theme"] is None:
+        if await _theme_resolver() is None:
+            fast = None
+    if fast is not None and fast.accepted:
+        logger.info("Fast path parsed query (confidence %.2f)", fast.confidence)
+        structured = fast.structured
+        PARSE_SOURCE.inc("fast")
+    else:
+        structured = await _extract(user_query)
+        log_llm_parse(user_query, structured)
+        PARSE_SOURCE.inc("llm")
+    parse_cache.set(cache_key, structured)
+    return structured
+
+
+async def _theme_resolver() -> Optional[ThemeResolver]:
+    """The theme resolver when it is enabled, loaded and built for the query embedding model."""
+    if not THEME_RESOLVER_ENABLED:
+        return None
+    resolver = await aget_theme_resolver()
+    if resolver is not None and resolver.model != embedding_model:
+        logger.warning("Theme vectors built with %s, queries use %s; skipping", resolver.model, embedding_model)
+        return None
+    return resolver
+
+
+async def _resolve_theme(state: InvestorState, cache_key: str, structured: dict) -> dict:
+    """Pick the theme from precomputed theme vectors; else leave suggestions on ``state``."""
+    resolver = await _theme_resolver()
+    if resolver is None:
+        return structured
+
+    try:
+        vector = await aembed(structured.get("keyword_query") or state.user_query)
+    except Exception as exc:
+        logger.warning("Theme resolution embedding failed: %s", exc)
+        THEME_RESOLUTION.inc("failed")
+        return structured
+
+    match = resolver.resolve(vector)
+    if match.theme is None:
+        logger.info("No clear theme (best %.2f, margin %.3f); suggesting %s", match.score, match.margin, match.suggestions)
+        state.theme_suggestions = match.suggestions
+        THEME_RESOLUTION.inc("ambiguous")
+        return structured
+
+    logger.info("Resolved theme %r locally (score %.2f, margin %.3f)", match.theme, match.score, match.margin)
+    structured = {**structured, "theme": match.theme}
+    parse_cache.set(cache_key, structured)
+    THEME_RESOLUTION.inc("resolved")
+    return structured
+
+
+async def _extract(user_query: str) -> dict:
+    """Ask GPT-4o for the StructuredQuery behind ``user_query``."""
     client = _get_client()
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="gpt-4o",
         temperature=0,
         tools=[
@@ -152,19 +236,9 @@ def clarifier(state: InvestorState) -> InvestorState:
         tool_choice={"type": "function", "function": {"name": "extract_query"}},
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": state.user_query},
+            {"role": "user", "content": user_query},
         ],
     )
     
     tool_args = response.choices[0].message.tool_calls[0].function.arguments
-    structured = StructuredQuery.model_validate_json(tool_args).model_dump()
-    
-    state.structured_query = structured
-    # The user needs to provide at least one of sector or keywords. Otherwise, we need clarification.
-    state.need_clarification = (
-        #structured["keywords"] is None \
-        structured["theme"] is None
-    )
-    state.budget = structured.get("budget")
-    
-    return state
+    return StructuredQuery.model_validate_json(tool_args).model_dump()
@@ -3,12 +3,12 @@
 from __future__ import annotations
 
 from weaviate.collections.classes.filters import Filter
-from typing import List, Optional
+from typing import Any, List, Optional
 import logging
 
 
 from ..state import InvestorState
-from ingestor.embed import embed
+from ingestor.embed import aembed
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,30 +44,44 @@ INFER_SECTOR_KEYWORDS = {
 #     return None
 
 
-def _build_where(q: dict) -> Optional[Filter]:
-    """Convert structured query into a Weaviate `_Filters` object."""
-    filters: list[Filter] = []
+def filter_spec(q: dict) -> list[tuple[str, str, Any]]:
+    """
+    Backend-neutral filter clauses `(property, operator, value)`, ANDed together.
+    Operators: "contains_any", "equal", "greater_than".
+    """
+    spec: list[tuple[str, str, Any]] = []
 
     theme = q.get("theme")
     if theme:
-        filters.append(
-            Filter.by_property("themes").contains_any([theme])
-        )
+        spec.append(("themes", "contains_any", [theme]))
     
     # if q["sector"]:
-    #     filters.append(Filter.by_property("sector").equal(q["sector"]))
+    #     spec.append(("sector", "equal", q["sector"]))
 
     if q["country"]:
-        filters.append(Filter.by_property("country").equal(q["country"]))
+        spec.append(("country", "equal", q["country"]))
     
     if q["ebitda_min"] > 0:
-        filters.append(Filter.by_property("ebitda_musd").greater_than(q["ebitda_min"]))
+        spec.append(("ebitda_musd", "greater_than", q["ebitda_min"]))
 
     if q["rev_growth_min"] > 0:
-        filters.append(Filter.by_property("rev_growth_pct").greater_than(q["rev_growth_min"]))
+        spec.append(("rev_growth_pct", "greater_than", q["rev_growth_min"]))
 
     if q["market_cap_min"] > 0:
-        filters.append(Filter.by_property("market_cap_musd").greater_than(q["market_cap_min"]))    
+        spec.append(("market_cap_musd", "greater_than", q["market_cap_min"]))
+
+    return spec
+
+
+def clause_filter(clause: tuple[str, str, Any]) -> Filter:
+    """Weaviate filter for a single `filter_spec` clause."""
+    prop, op, value = clause
+    return getattr(Filter.by_property(prop), op)(value)
+
+
+def _build_where(q: dict) -> Optional[Filter]:
+    """Convert structured query into a Weaviate `_Filters` object."""
+    filters: list[Filter] = [clause_filter(c) for c in filter_spec(q)]
 
     if not filters:
         return None
@@ -77,10 +91,11 @@ def _build_where(q: dict) -> Optional[Filter]:
         return Filter.all_of(filters)
 
 
-def query_fix(state: InvestorState) -> InvestorState:
-    """Fill defaults, infer sector and create Weaviate query helpers."""
-    logger.info("Query_fix agent received structured_query: %s", state.structured_query)
-    
+def prepare_query(state: InvestorState) -> str:
+    """
+    Fill defaults and build the filter on `state`; return the text to embed
+    (empty when there is nothing to embed).
+    """
     q = state.structured_query.copy()
 
     for fld, default in DEFAULTS.items():
@@ -113,10 +128,15 @@ def query_fix(state: InvestorState) -> InvestorState:
     parts = [q["keyword_query"], theme or ""]
     
     logger.info("Text to embed: %s", parts)   
-    text_to_embed = " | ".join(p for p in parts if p)   # drop falsy parts
-    embedding = embed(text_to_embed) if text_to_embed else None
-    state.near_vector = embedding 
-    
     state.structured_query = q
+    return " | ".join(p for p in parts if p)   # drop falsy parts
+
+
+async def query_fix(state: InvestorState) -> InvestorState:
+    """Fill defaults, infer sector and create Weaviate query helpers."""
+    logger.info("Query_fix agent received structured_query: %s", state.structured_query)
+    
+    text_to_embed = prepare_query(state)
+    state.near_vector = await aembed(text_to_embed) if text_to_embed else None
 
     return state
@@ -4,9 +4,9 @@ from __future__ import annotations
 
 # ── stdlib ────────────────────────────────────────────────────────────────
 import os
+import asyncio
 import logging
-from functools import lru_cache
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 # ── third-party ───────────────────────────────────────────────────────────
 from dotenv import load_dotenv
@@ -14,82 +14,176 @@ import weaviate
 from weaviate.classes.query import MetadataQuery, HybridFusion
 
 # ── local ─────────────────────────────────────────────────────────────────
+from agent_service.resources import resources
+from ingestor.doc_store import list_summary
 from ..state import InvestorState
+from ..result_cache import search_cache, search_key, refresh_corpus_version
+from ..local_index import NUMERIC_FIELDS, TEXT_FIELDS, LocalIndex, aget_local_index
+from ..metrics import track
+from ..single_flight import search_flight
+from .query_fix import filter_spec
 
 # ── logging / env ─────────────────────────────────────────────────────────
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-WEAVIATE_URL    = os.getenv("WEAVIATE_URL", "weaviate")
 COLLECTION_NAME = os.getenv("WEAVIATE_COLLECTION")
 RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "10"))
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "weaviate")   # "weaviate" | "local"
+
+# List-view properties returned per hit ("*" = every stored property). The
+# full record (keywords, full description) is served by /company/{ticker}.
+_RETURN_PROPERTIES = os.getenv(
+    "RETRIEVAL_RETURN_PROPERTIES",
+    "ticker,name,sector,country,themes,market_cap_musd,ebitda_musd,rev_growth_pct,summary",
+)
+RETURN_PROPERTIES: Optional[list[str]] = (
+    None if _RETURN_PROPERTIES.strip() == "*"
+    else [p.strip() for p in _RETURN_PROPERTIES.split(",") if p.strip()]
+)
+def candidate_properties() -> Optional[list[str]]:
+    """Properties to fetch for in-process re-ranking: the list view plus filter / BM25 fields."""
+    if RETURN_PROPERTIES is None:
+        return None
+    return list(dict.fromkeys([*RETURN_PROPERTIES, "summary", "themes", *TEXT_FIELDS, *NUMERIC_FIELDS]))
+
+
+def project(props: dict) -> dict:
+    """
+    List view of a stored object. Weaviate objects already store the summary
+    fallback (see `ingest.properties`); local docs get it here.
+    """
+    if RETURN_PROPERTIES is None:
+        return dict(props)
+    out = {k: props[k] for k in RETURN_PROPERTIES if k in props}
+    if "summary" in RETURN_PROPERTIES and not out.get("summary") and props.get("description"):
+        out["summary"] = list_summary(props)
+    return out
+
+
+async def _get_client() -> weaviate.WeaviateAsyncClient:
+    """Return the process-wide async client (see `agent_service.resources`)."""
+    return await resources.weaviate()
+
+
+async def retriever(state: InvestorState) -> InvestorState:
+    """Populate `state.retrieved_docs` with companies returned by the search backend."""
+    logger.info("Retriever received structured query: %s", state.structured_query)
 
+    if RETRIEVAL_BACKEND == "local":
+        index, reloaded = await aget_local_index()
+        if reloaded:
+            search_cache.clear()
+    else:
+        collection = (await _get_client()).collections.get(COLLECTION_NAME)
+        await refresh_corpus_version(collection)
+
+    cache_key = search_key(state.structured_query, RETRIEVAL_LIMIT)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Serving %d documents from the search cache.", len(cached))
+        state.retrieved_docs = cached
+        if not cached:
+            state.error = "No documents found matching the query."
+        return state
+
+    keyword_query = _keyword_query(state)
+    logger.info(f"Keyword_query: {keyword_query}")
 
-@lru_cache(maxsize=1)
-def _get_client() -> weaviate.WeaviateClient:
-    try:
-        return weaviate.connect_to_local(WEAVIATE_URL)
-    except Exception as exc:
-        raise RuntimeError("Could not connect to Weaviate.\n" + str(exc)) from exc
+    async def search() -> List[Dict[str, Any]]:
+        if RETRIEVAL_BACKEND == "local":
+            spec = filter_spec(state.structured_query)
+            if spec:
+                logger.info("Filter plan: %s", index.plan(spec).describe())
+            docs = _search_local(index, state, keyword_query, spec)
+        else:
+            docs = await _search_weaviate(collection, state, keyword_query)
+        search_cache.set(cache_key, docs)
+        logger.info("Retrieved %d documents from %s.", len(docs), RETRIEVAL_BACKEND)
+        return docs
+
+    # identical searches arriving together share one backend round trip
+    docs = await search_flight.do(cache_key, search)
+    state.retrieved_docs = docs
 
+    if not docs:
+        state.error = "No documents found matching the query."
 
-def retriever(state: InvestorState) -> InvestorState:
-    """Populate `state.retrieved_docs` with companies returned by Weaviate."""
-    logger.info("Retriever received structured query: %s", state.structured_query)
+    return state
 
-    collection = _get_client().collections.get(COLLECTION_NAME)
 
-    # ------------------------------------------------------------------ #
-    # Build BM-25 keyword string                                         #
-    # ------------------------------------------------------------------ #
-    keyword_query: str = (
+def _keyword_query(state: InvestorState) -> str:
+    """BM-25 keyword string for the current StructuredQuery."""
+    return (
         getattr(state, "keyword_query", "") or
         " ".join(state.structured_query.get("keywords", []))
     ).strip()
-    
-    logger.info(f"Keyword_query: {keyword_query}")
 
+
+def _search_local(
+    index: LocalIndex, state: InvestorState, keyword_query: str, spec: list,
+) -> List[Dict[str, Any]]:
+    """Same query shapes as `_search_weaviate`, answered from the in-memory corpus."""
+    if keyword_query:
+        hits = index.hybrid(
+            keyword_query, state.near_vector, spec, RETRIEVAL_LIMIT,
+            alpha=0.7, properties=("summary",),
+        )
+    elif state.near_vector is not None:
+        hits = index.search(state.near_vector, spec, RETRIEVAL_LIMIT)
+    else:
+        hits = []
+
+    docs: List[Dict[str, Any]] = []
+    for row, score in hits:
+        if score > 0.01:
+            props = project(index.doc(row))
+            props["_relevance"] = score
+            docs.append(props)
+    return docs
+
+
+async def _search_weaviate(collection, state: InvestorState, keyword_query: str) -> List[Dict[str, Any]]:
+    # Selective filters need no client-side help: below the collection's
+    # flatSearchCutoff Weaviate already brute-forces the survivors.
     meta = MetadataQuery(distance=True, score=True)
 
     # ------------------------------------------------------------------ #
     # Execute query (hybrid or pure vector)                              #
     # ------------------------------------------------------------------ #
     if keyword_query:
-        response = collection.query.hybrid(
-            query=keyword_query,
-            vector=state.near_vector,
-            alpha=0.7,
-            query_properties=["summary"],
-            fusion_type=HybridFusion.RELATIVE_SCORE,
-            limit=RETRIEVAL_LIMIT,
-            filters=state.where_filter,        # ← filter goes here
-            return_metadata=meta
-        )
+        async with track("weaviate", "hybrid"):
+            response = await collection.query.hybrid(
+                query=keyword_query,
+                vector=state.near_vector,
+                alpha=0.7,
+                query_properties=["summary"],
+                fusion_type=HybridFusion.RELATIVE_SCORE,
+                limit=RETRIEVAL_LIMIT,
+                filters=state.where_filter,        # ← filter goes here
+                return_properties=RETURN_PROPERTIES,
+                return_metadata=meta
+            )
     else:
-        response = collection.query.near_vector(
-            near_vector=state.near_vector,
-            limit=RETRIEVAL_LIMIT,
-            filters=state.where_filter,        # ← filter goes here
-            return_metadata=meta
-        )
+        async with track("weaviate", "near_vector"):
+            response = await collection.query.near_vector(
+                near_vector=state.near_vector,
+                limit=RETRIEVAL_LIMIT,
+                filters=state.where_filter,        # ← filter goes here
+                return_properties=RETURN_PROPERTIES,
+                return_metadata=meta
+            )
 
     # ------------------------------------------------------------------ #
     # Marshal results                                                    #
     # ------------------------------------------------------------------ #
     docs: List[Dict[str, Any]] = []
     for obj in response.objects:
-        props = obj.properties or {}
+        props = project(obj.properties or {})
 
         # distance for pure-vector, score for hybrid
         if obj.metadata:
             if obj.metadata.score is not None and obj.metadata.score > 0.01:
                 props["_relevance"] = obj.metadata.score          # 0-1 already
                 docs.append(props)
-
-    state.retrieved_docs = docs
-    logger.info("Retrieved %d documents from Weaviate.", len(docs))
-
-    if not docs:
-        state.error = "No documents found matching the query."
-
-    return state
+    return docs
@@ -0,0 +1,171 @@
+"""
+Speculative retrieval that overlaps the clarifier's LLM call.
+
+While GPT-4o parses the query, the backend is warmed up: the local index is
+loaded, or (Weaviate) the raw `user_query` is embedded and an over-sized,
+unfiltered candidate set (SPECULATIVE_CANDIDATES) is fetched with vectors. Once the StructuredQuery arrives, the text the Enricher would embed
+(`prepare_query`) is embedded – usually an embedding-cache hit – and, if
+enough candidates survive the filters, the result is final and the
+Enricher / Retriever round trips are skipped; otherwise the normal path runs.
+
+  • local backend – the search runs on the full index, so results are
+    exactly the Retriever's
+  • Weaviate      – the candidates are re-scored in process: a filter mask,
+    one matrix-vector product for cosine similarity and, with keywords, BM25
+    over the surviving candidates (term statistics from that set, not the
+    whole collection). No per-request LocalIndex is built.
+
+Results go into `search_cache` under the Retriever's key, so a repeat of the
+query ranks the same whichever path served it first.
+
+Enabled with SPECULATIVE_RETRIEVAL=true.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..state import InvestorState
+from ..bm25 import BM25Index, relative_score_fusion
+from ..local_index import aget_local_index, filter_mask
+from ..metrics import SPECULATION, track
+from ..result_cache import search_cache, search_key
+from .clarifier import clarifier
+from .query_fix import filter_spec, prepare_query
+from .retriever import (
+    RETRIEVAL_BACKEND, RETRIEVAL_LIMIT, COLLECTION_NAME,
+    _get_client, _keyword_query, _search_local, candidate_properties, project,
+)
+from ingestor.embed import aembed
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_RETRIEVAL  = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "200"))
+
+
+@dataclass
+class Candidates:
+    props: list[dict]
+    vectors: np.ndarray      # unit rows; all-zero where the object has no vector
+    complete: bool           # fewer hits than asked for: the whole collection
+
+
+async def _prefetch(user_query: str) -> Optional[Candidates]:
+    """
+    Warm up what the final ranking needs: the local index, or (Weaviate) the
+    raw query's embedding and its unfiltered nearest candidates with vectors.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        await aget_local_index()
+        return None
+
+    vector = await aembed(user_query)
+    collection = (await _get_client()).collections.get(COLLECTION_NAME)
+    async with track("weaviate", "speculative_near_vector"):
+        response = await collection.query.near_vector(
+            near_vector=vector,
+            limit=SPECULATIVE_CANDIDATES,
+            include_vector=True,
+            return_properties=candidate_properties(),
+        )
+    props, vectors = [], np.zeros((len(response.objects), len(vector)), dtype=np.float32)
+    for i, obj in enumerate(response.objects):
+        props.append(dict(obj.properties))
+        v = (obj.vector or {}).get("default")
+        if v is not None and len(v) == len(vector):
+            vectors[i] = v
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms > 0, norms, 1.0)
+    return Candidates(props, vectors, len(props) < SPECULATIVE_CANDIDATES)
+
+
+def _rank_candidates(
+    candidates: Candidates, rows: np.ndarray, state: InvestorState, keyword_query: str,
+) -> List[Dict[str, Any]]:
+    """`_search_local`'s query shapes over the surviving candidate `rows`."""
+    vector_hits: dict[int, float] = {}
+    if state.near_vector is not None:
+        q = np.asarray(state.near_vector, dtype=np.float32)
+        scores = candidates.vectors[rows] @ (q / (np.linalg.norm(q) or 1.0))
+        vector_hits = {int(r): float(s) for r, s in zip(rows, scores)}
+
+    if keyword_query:
+        scores = BM25Index([candidates.props[r] for r in rows]).score(keyword_query)
+        keyword_hits = {int(r): float(s) for r, s in zip(rows, scores) if s > 0}
+        fused = relative_score_fusion(vector_hits, keyword_hits, alpha=0.7)    # as the Retriever
+        hits = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:RETRIEVAL_LIMIT]
+    else:
+        hits = sorted(vector_hits.items(), key=lambda kv: kv[1], reverse=True)[:RETRIEVAL_LIMIT]
+
+    docs: List[Dict[str, Any]] = []
+    for row, score in hits:
+        if score > 0.01:
+            props = project(candidates.props[row])
+            props["_relevance"] = score
+            docs.append(props)
+    return docs
+
+
+async def speculative_parser(state: InvestorState) -> InvestorState:
+    """`clarifier` with the embedding and a first search running alongside it."""
+    prefetch = asyncio.create_task(_prefetch(state.user_query))
+    prefetch.add_done_callback(lambda t: t.cancelled() or t.exception())   # never "unretrieved"
+    try:
+        state = await clarifier(state)
+    except BaseException:
+        prefetch.cancel()
+        raise
+
+    # Still running (e.g. the parse came from the cache or fast path): the
+    # normal path is no slower than waiting, and its ranking is exact.
+    if state.need_clarification or not prefetch.done():
+        prefetch.cancel()
+        SPECULATION.inc("skipped")
+        return state
+
+    try:
+        candidates = prefetch.result()
+    except Exception as exc:
+        logger.warning("Speculative prefetch failed: %s", exc)
+        SPECULATION.inc("failed")
+        return state
+
+    try:
+        text_to_embed = prepare_query(state)
+    except ValueError:
+        return state                                # the Enricher reports it
+    spec = filter_spec(state.structured_query)
+    rows = None
+    if candidates is not None:
+        rows = np.flatnonzero(filter_mask(candidates.props, spec) & candidates.vectors.any(axis=1))
+        if rows.size < RETRIEVAL_LIMIT and not candidates.complete:
+            logger.info("Speculative set too small (%d of %d left after filters)", rows.size, len(candidates.props))
+            SPECULATION.inc("miss")
+            return state
+
+    # rank with the same vector the normal path would use
+    state.near_vector = await aembed(text_to_embed) if text_to_embed else None
+    cache_key = search_key(state.structured_query, RETRIEVAL_LIMIT)
+    docs = search_cache.get(cache_key)
+    if docs is None:
+        keyword_query = _keyword_query(state)
+        if candidates is None:
+            index, _ = await aget_local_index()
+            docs = _search_local(index, state, keyword_query, spec)
+        else:
+            docs = _rank_candidates(candidates, rows, state, keyword_query)
+        search_cache.set(cache_key, docs)
+    state.retrieved_docs = docs
+    if not state.retrieved_docs:
+        state.error = "No documents found matching the query."
+    state.speculative_hit = True
+    SPECULATION.inc("hit")
+    logger.info("Speculative retrieval served %d documents", len(state.retrieved_docs))
+    return state
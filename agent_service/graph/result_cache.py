@@ -0,0 +1,131 @@
+"""
+In-process result caches for repeated screening questions.
+
+Two levels:
+  • parse cache  – normalized user text  → StructuredQuery dict (skips GPT-4o)
+  • search cache – canonical query + limit → retrieved_docs  (skips Weaviate)
+
+plus a detail cache of full company records served by `/company/{ticker}`.
+
+Search and detail entries are tied to the corpus version the ingestor stamps on the
+collection, so a new ingest run invalidates them automatically.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from ingestor.corpus_version import parse_version
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_SIZE    = int(os.getenv("PARSE_CACHE_SIZE", "4096"))
+PARSE_CACHE_TTL_S   = float(os.getenv("PARSE_CACHE_TTL_S", "86400"))
+SEARCH_CACHE_SIZE   = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL_S  = float(os.getenv("SEARCH_CACHE_TTL_S", "900"))
+VERSION_CHECK_S     = float(os.getenv("CORPUS_VERSION_CHECK_S", "30"))
+DETAIL_CACHE_SIZE   = int(os.getenv("DETAIL_CACHE_SIZE", "4096"))
+DETAIL_CACHE_TTL_S  = float(os.getenv("DETAIL_CACHE_TTL_S", "3600"))
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry. Values are copied in and out."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(item[1])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+parse_cache  = TTLCache(PARSE_CACHE_SIZE, PARSE_CACHE_TTL_S)
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S)
+detail_cache = TTLCache(DETAIL_CACHE_SIZE, DETAIL_CACHE_TTL_S)
+
+
+# ── keys ──────────────────────────────────────────────────────────────────
+def normalize_query(text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of `text`."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?.!").strip().lower()
+
+
+def canonical_query(q: dict) -> str:
+    """Stable JSON for a (defaults-filled) structured query."""
+    def norm(v):
+        if isinstance(v, list):
+            return sorted(str(x).strip().lower() for x in v)
+        if isinstance(v, str):
+            return v.strip().lower()
+        return v
+    return json.dumps({k: norm(v) for k, v in q.items() if k != "budget"}, sort_keys=True)
+
+
+def search_key(q: dict, limit: int) -> tuple:
+    return (canonical_query(q), limit, _version.current)
+
+
+# ── corpus version tracking ───────────────────────────────────────────────
+class _CorpusVersion:
+    def __init__(self):
+        self.current: Optional[str] = None
+        self._checked = 0.0
+
+    async def refresh(self, collection) -> Optional[str]:
+        """Re-read the stamp at most every VERSION_CHECK_S; clear on change."""
+        now = time.monotonic()
+        if now - self._checked < VERSION_CHECK_S:
+            return self.current
+        self._checked = now
+        try:
+            config = await collection.config.get(simple=True)
+        except Exception as exc:
+            logger.warning("Could not read corpus version: %s", exc)
+            return self.current
+        version = parse_version(config.description)
+        if version != self.current:
+            if self.current is not None:
+                logger.info("Corpus version %s → %s; clearing search cache", self.current, version)
+            search_cache.clear()
+            detail_cache.clear()
+            self.current = version
+        return version
+
+
+_version = _CorpusVersion()
+refresh_corpus_version = _version.refresh
@@ -0,0 +1,84 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When several requests need the same result at the same moment – a burst of
+identical screens after a market event – the first caller (the leader) runs
+the work and everyone arriving while it is in flight (followers) awaits the
+same result. Nothing is kept once the call completes, so unlike the caches
+this never serves stale data. Used at four levels:
+
+  • query   – whole `/query` graph runs, by normalized query text
+  • parse   – clarifier LLM calls, by normalized query text
+  • search  – retriever searches, by canonical StructuredQuery + limit
+  • embed   – embedding calls, by input text
+
+Followers get a deep copy so nobody mutates a shared result. Counts are
+exported as `agentinvest_single_flight_total{stage,role}`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from .metrics import SINGLE_FLIGHT
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._followers: dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn()` unless an identical call (same `key`) is in flight; then share its result."""
+        if not SINGLE_FLIGHT_ENABLED:
+            return await fn()
+
+        future = self._inflight.get(key)
+        if future is not None:
+            SINGLE_FLIGHT.inc(self.stage, "follower")
+            self._followers[key] = self._followers.get(key, 0) + 1
+            try:
+                return copy.deepcopy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                # the leader was cancelled, not us: run it ourselves
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.do(key, fn)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())   # never "unretrieved"
+        self._inflight[key] = future
+        SINGLE_FLIGHT.inc(self.stage, "leader")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            # followers resume after the leader's caller may have touched `result`
+            future.set_result(copy.deepcopy(result) if self._followers.get(key) else result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._followers.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+query_flight  = SingleFlight("query")
+parse_flight  = SingleFlight("parse")
+search_flight = SingleFlight("search")
+embed_flight  = SingleFlight("embed")
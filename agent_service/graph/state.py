@@ -13,4 +13,6 @@ class InvestorState(BaseModel):
     explanation_md: str | None = None      # TODO: output of optimizer
     where_filter: Optional[Any] = None
     near_vector: Optional[list] = None
+    speculative_hit: bool = False          # retrieved during parsing; skip Enricher / Retriever
+    theme_suggestions: list[str] = []      # closest themes when none could be resolved
     error: Optional[Any] = None
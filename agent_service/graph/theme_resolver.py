@@ -0,0 +1,134 @@
+"""
+Local theme resolution from precomputed theme vectors.
+
+When the parse comes back without a theme, the query's embedding is
+compared (cosine) with every theme's vector – a blend of its label
+embedding and, when companies carry the theme, their centroid. A clear
+winner (score ≥ THEME_MIN_SCORE and ahead of the runner-up by
+THEME_MIN_MARGIN) is taken as the theme; otherwise the best-matching
+parent theme's children are offered as suggestions. Either way this costs
+one (usually cached) embedding instead of another clarification round trip.
+
+Vectors come from `themes.npz` written by `ingestor.theme_centroids`; without
+that file resolution is disabled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from ingestor.doc_store import DOC_STORE_PATH
+from ingestor.theme_centroids import theme_path
+
+logger = logging.getLogger(__name__)
+
+THEME_RESOLVER_ENABLED = os.getenv("THEME_RESOLVER_ENABLED", "true").lower() == "true"
+THEME_MIN_SCORE        = float(os.getenv("THEME_MIN_SCORE", "0.35"))
+THEME_MIN_MARGIN       = float(os.getenv("THEME_MIN_MARGIN", "0.03"))
+THEME_CENTROID_WEIGHT  = float(os.getenv("THEME_CENTROID_WEIGHT", "0.5"))   # 0 = labels only
+THEME_SUGGESTIONS      = int(os.getenv("THEME_SUGGESTIONS", "3"))
+THEME_RELOAD_CHECK_S   = float(os.getenv("CORPUS_VERSION_CHECK_S", "30"))
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms > 0, norms, 1.0)
+
+
+@dataclass
+class ThemeMatch:
+    theme: Optional[str]                 # set when the match is unambiguous
+    score: float
+    margin: float
+    parent: Optional[str] = None         # best parent theme
+    suggestions: list[str] = field(default_factory=list)
+
+
+class ThemeResolver:
+    def __init__(self, names, kinds, labels, members, member_counts, model: str,
+                 centroid_weight: float = THEME_CENTROID_WEIGHT):
+        names, kinds = [str(n) for n in names], [str(k) for k in kinds]
+        self.model = model
+        labels, members = _unit(np.asarray(labels, dtype=np.float32)), _unit(np.asarray(members, dtype=np.float32))
+        has_members = (np.asarray(member_counts) > 0)[:, None]
+        blended = np.where(has_members, (1 - centroid_weight) * labels + centroid_weight * members, labels)
+        vectors = _unit(blended)
+
+        theme_rows = [i for i, k in enumerate(kinds) if k == "theme"]
+        parent_rows = [i for i, k in enumerate(kinds) if k == "parent"]
+        self.themes = [names[i] for i in theme_rows]
+        self.parents = [names[i] for i in parent_rows]
+        self.theme_vectors = vectors[theme_rows]
+        self.parent_vectors = vectors[parent_rows]
+
+        from agent_service.theme_taxonomy import PARENT_THEME
+        self.parent_of = {t: PARENT_THEME.get(t) for t in self.themes}
+
+    @classmethod
+    def load(cls, path: str) -> "ThemeResolver":
+        with np.load(path) as data:
+            return cls(
+                data["names"], data["kinds"], data["labels"], data["members"],
+                data["member_counts"], str(data["model"]),
+            )
+
+    def resolve(self, vector: list[float]) -> ThemeMatch:
+        q = _unit(np.asarray(vector, dtype=np.float32))
+        scores = self.theme_vectors @ q
+        order = np.argsort(-scores)
+        best = int(order[0])
+        top = float(scores[best])
+        margin = top - float(scores[order[1]]) if len(order) > 1 else top
+
+        parent_scores = self.parent_vectors @ q
+        parent = self.parents[int(np.argmax(parent_scores))] if self.parents else None
+
+        if top >= THEME_MIN_SCORE and margin >= THEME_MIN_MARGIN:
+            return ThemeMatch(self.themes[best], top, margin, self.parent_of.get(self.themes[best]))
+
+        # ambiguous: offer the closest themes under the closest parent
+        suggestions = [self.themes[i] for i in order if self.parent_of.get(self.themes[i]) == parent]
+        return ThemeMatch(None, top, margin, parent, suggestions[:THEME_SUGGESTIONS])
+
+
+# ── process-wide instance ─────────────────────────────────────────────────
+_resolver: Optional[ThemeResolver] = None
+_mtime: Optional[float] = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def get_theme_resolver(store_path: str = DOC_STORE_PATH) -> Optional[ThemeResolver]:
+    """
+    The resolver for the current theme file (reloaded when it changes), or None.
+    Blocking – async code uses `aget_theme_resolver`.
+    """
+    global _resolver, _mtime, _checked
+    with _lock:
+        now = time.monotonic()
+        if _checked and now - _checked < THEME_RELOAD_CHECK_S:
+            return _resolver
+        _checked = now
+        path = theme_path(store_path)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if mtime != _mtime:
+            _resolver = ThemeResolver.load(path) if mtime is not None else None
+            _mtime = mtime
+            if _resolver is not None:
+                logger.info("Loaded %d theme vectors from %s", len(_resolver.themes), path)
+        return _resolver
+
+
+async def aget_theme_resolver(store_path: str = DOC_STORE_PATH) -> Optional[ThemeResolver]:
+    """`get_theme_resolver` for the event loop: the stat and (re)load run in a worker thread."""
+    if _checked and time.monotonic() - _checked < THEME_RELOAD_CHECK_S:
+        return _resolver
+    return await asyncio.to_thread(get_theme_resolver, store_path)
@@ -1,27 +1,178 @@
 # agent_service/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from typing import Any, AsyncIterator
+from contextlib import asynccontextmanager
 import datetime
+import logging
+import time
 #from langfuse.langchain import CallbackHandler
 
 from agent_service.graph.state import InvestorState
 from agent_service.graph.build_graph import build_engine
+from agent_service.graph import metrics
+from agent_service.graph.nodes.query_fix import filter_spec
+from agent_service.graph.batch import BATCH_MAX_QUERIES, run_batch
+from agent_service.graph.company_details import company_details
+from agent_service.graph.result_cache import normalize_query
+from agent_service.graph.single_flight import query_flight
+from agent_service.graph.local_index import aget_local_index
+from agent_service.graph.theme_resolver import THEME_RESOLVER_ENABLED, aget_theme_resolver
+from agent_service.graph.nodes.retriever import RETRIEVAL_BACKEND
+from agent_service.resources import lifespan
+from agent_service.responses import FieldGroup, QueryResponse, build_response, compact_doc, dumps, encode
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI and Agents graph
-app = FastAPI(title="Agent Service")
+# shared OpenAI / Weaviate clients are opened at startup and closed on shutdown
+@asynccontextmanager
+async def app_lifespan(app: FastAPI):
+    async with lifespan(app, connect_weaviate=RETRIEVAL_BACKEND == "weaviate"):
+        if RETRIEVAL_BACKEND == "local":
+            await aget_local_index()        # load the corpus before the first request
+        if THEME_RESOLVER_ENABLED:
+            await aget_theme_resolver()
+        yield
+
+app = FastAPI(title="Agent Service", lifespan=app_lifespan)
 engine = build_engine()
 
 class QueryRequest(BaseModel):
     query: str
+    include: list[FieldGroup] = []      # opt-in response groups: details / vectors / debug
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    include: list[FieldGroup] = []
+
+@app.post("/query", response_model=QueryResponse)
+async def handle_query(req: QueryRequest, request: Request):
+    """
+    Execute the agent against the provided query. JSON by default,
+    MessagePack with `Accept: application/msgpack`.
+    """
+    async with metrics.track_request("/query"):
+        try:
+            # identical screens in flight at the same time share one graph run
+            result = await query_flight.do(
+                normalize_query(req.query),
+                lambda: engine.ainvoke(InvestorState(user_query=req.query)),
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+        return encode(build_response(result, frozenset(req.include)), request)
+
+
+def _sse(event: str, payload: Any) -> str:
+    return f"event: {event}\ndata: {dumps(payload).decode()}\n\n"
+
+
+async def stream_events(query: str, include: frozenset[str] = frozenset()) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Run the graph and yield (event, payload) as each node finishes:
+    `parsed` (Parser), `filters` (Enricher), one `company` per retrieved
+    document (Retriever), then `done`.
+    """
+    state: dict = {}
+    async for update in engine.astream(InvestorState(user_query=query), stream_mode="updates"):
+        for node, value in update.items():
+            state.update(value or {})
+            speculative = node == "Parser" and state.get("speculative_hit")
+            if node == "Parser":
+                yield "parsed", {
+                    "structured_query": state.get("structured_query"),
+                    "need_clarification": state.get("need_clarification", False),
+                    "theme_suggestions": state.get("theme_suggestions") or [],
+                }
+            if node == "Enricher" or speculative:
+                q = state.get("structured_query") or {}
+                yield "filters", {
+                    "structured_query": q,
+                    "filters": [
+                        {"property": prop, "operator": op, "value": value}
+                        for prop, op, value in filter_spec(q)
+                    ],
+                }
+            if node == "Retriever" or speculative:
+                for rank, doc in enumerate(state.get("retrieved_docs") or [], start=1):
+                    yield "company", {"rank": rank, "doc": compact_doc(doc, include)}
+    yield "done", {
+        "count": len(state.get("retrieved_docs") or []),
+        "need_clarification": state.get("need_clarification", False),
+        "error": state.get("error"),
+    }
+
+
+@app.post("/query/stream")
+async def handle_query_stream(req: QueryRequest):
+    """Server-sent events version of `/query` for progressive rendering."""
+
+    async def body() -> AsyncIterator[str]:
+        # Headers are already sent, so failures are reported as an `error` event.
+        start, status = time.perf_counter(), 200
+        try:
+            async for event, payload in stream_events(req.query, frozenset(req.include)):
+                yield _sse(event, payload)
+        except Exception as exc:
+            status = 500
+            logger.exception("Streaming query failed")
+            yield _sse("error", {"detail": str(exc)})
+        finally:
+            metrics.observe_request("/query/stream", time.perf_counter() - start, status)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/batch")
+async def handle_query_batch(req: BatchQueryRequest):
+    """
+    Screen many queries at once. Streams one JSON line per input query as it
+    completes (`index` gives its position), then a final `{"done": ...}` line.
+    """
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+
+    include = frozenset(req.include)
+
+    async def body() -> AsyncIterator[str]:
+        start, status, count = time.perf_counter(), 200, 0
+        try:
+            async for row in run_batch(req.queries):
+                count += 1
+                row["retrieved_docs"] = [compact_doc(d, include) for d in row["retrieved_docs"]]
+                yield dumps(row).decode() + "\n"
+        except Exception as exc:
+            status = 500
+            logger.exception("Batch query failed")
+            yield dumps({"error": str(exc)}).decode() + "\n"
+        finally:
+            metrics.observe_request("/query/batch", time.perf_counter() - start, status)
+        yield dumps({"done": True, "results": count, "elapsed_s": round(time.perf_counter() - start, 3)}).decode() + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 
-@app.post("/query")
-async def handle_query(req: QueryRequest):
-    """Execute the agent against the provided query."""
-    state = InvestorState(user_query=req.query)
+@app.get("/company/{ticker}")
+async def get_company(ticker: str, request: Request):
+    """
+    Full stored record (description, keywords, ...) of one company. Search
+    results only carry list-view properties; clients fetch this on demand.
+    """
+    async with metrics.track_request("/company"):
+        doc = await company_details(ticker)
+        if doc is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ticker {ticker!r}.")
+        return encode(doc, request)
 
-    try:
-        result = engine.invoke(state)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    return result
\ No newline at end of file
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint: node / upstream latency, tokens, cache hits."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,341 @@
+"""
+Shared, adaptive rate limiting and retries for every OpenAI call.
+
+Each model gets a budget of requests and tokens per minute (token buckets
+refilling at RPM/60 and TPM/60 per second) plus an adaptive concurrency
+cap. Budgets start from OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT and are
+corrected from the `x-ratelimit-*` headers of every response, so they track
+the organisation-wide quota other processes are spending too.
+
+  • online calls (the agent service) may use the whole budget and are served
+    before background calls waiting in the same process;
+  • background calls (ingest) leave OPENAI_BACKGROUND_RESERVE of the quota
+    untouched. Ingest runs in its own process, so that reserve – seen through
+    the shared headers – is all that protects live queries from it; the
+    online-first queueing above never crosses a process boundary;
+  • a 429 halves the concurrency cap and pauses the model until the reset
+    the server announced (at most OPENAI_BACKOFF_MAX_S); successes grow the
+    cap back one step at a time;
+  • 429s, timeouts, connection errors and 5xx are retried with full-jitter
+    exponential backoff until the caller's deadline
+    (OPENAI_RETRY_DEADLINE_S online, OPENAI_BACKGROUND_RETRY_DEADLINE_S for ingest).
+
+`limit_openai(client, priority)` wraps a client's chat and embedding
+`create`; `header_hooks()` feeds response headers back from httpx.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+import openai
+
+from agent_service.graph.metrics import OPENAI_LIMITER_WAIT, OPENAI_RETRIES
+
+logger = logging.getLogger(__name__)
+
+OPENAI_RPM_LIMIT                   = int(os.getenv("OPENAI_RPM_LIMIT", "500"))        # per model, until headers say otherwise
+OPENAI_TPM_LIMIT                   = int(os.getenv("OPENAI_TPM_LIMIT", "300000"))
+OPENAI_MAX_CONCURRENCY             = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_BACKGROUND_RESERVE          = float(os.getenv("OPENAI_BACKGROUND_RESERVE", "0.2"))
+OPENAI_RETRY_DEADLINE_S            = float(os.getenv("OPENAI_RETRY_DEADLINE_S", "30"))
+OPENAI_BACKGROUND_RETRY_DEADLINE_S = float(os.getenv("OPENAI_BACKGROUND_RETRY_DEADLINE_S", "300"))
+OPENAI_BACKOFF_BASE_S              = float(os.getenv("OPENAI_BACKOFF_BASE_S", "0.5"))
+OPENAI_BACKOFF_MAX_S               = float(os.getenv("OPENAI_BACKOFF_MAX_S", "20"))
+COMPLETION_TOKENS_ESTIMATE         = int(os.getenv("OPENAI_COMPLETION_TOKENS_ESTIMATE", "400"))
+
+ONLINE, BACKGROUND = "online", "background"
+POLL_S = 0.02           # re-check interval while waiting for a concurrency slot
+
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# model of the call in flight, read by the httpx response hook
+_current_model: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("openai_model", default=None)
+
+
+class RateLimitTimeout(RuntimeError):
+    """The call could not be admitted (or retried) before its deadline."""
+
+
+# ── header parsing ────────────────────────────────────────────────────────
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_S = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset durations ("20ms", "1s", "6m0s") in seconds."""
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNIT_S[unit] for n, unit in parts)
+
+
+def retry_after(headers) -> Optional[float]:
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            return None
+    resets = [parse_duration(headers.get(h)) for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    resets = [r for r in resets if r is not None]
+    # whichever bucket refills first may already let the next request through
+    return min(resets) if resets else None
+
+
+def estimate_tokens(op: str, kwargs: dict) -> int:
+    """Conservative request cost (~3 chars per token) for budgeting before the call."""
+    if op == "embeddings":
+        inputs = kwargs.get("input") or []
+        return sum(len(t) // 3 + 1 for t in ([inputs] if isinstance(inputs, str) else inputs))
+    chars = sum(len(str(m.get("content") or "")) for m in kwargs.get("messages") or [])
+    if kwargs.get("tools"):
+        chars += len(json.dumps(kwargs["tools"]))
+    return chars // 3 + 1 + (kwargs.get("max_tokens") or COMPLETION_TOKENS_ESTIMATE)
+
+
+# ── per-model budget ──────────────────────────────────────────────────────
+class _Budget:
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm, self.tpm = float(rpm), float(tpm)
+        self.requests, self.tokens = self.rpm, self.tpm
+        self.updated = time.monotonic()
+        self.cap = float(OPENAI_MAX_CONCURRENCY)       # adaptive concurrency (AIMD)
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.online_waiting = 0
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def wait(self, cost: int, priority: str, now: float) -> float:
+        """Seconds until the call may start (0 = admitted and charged)."""
+        self.refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if priority == BACKGROUND and self.online_waiting:
+            return POLL_S
+        if self.inflight >= int(self.cap):
+            return POLL_S
+        reserve = OPENAI_BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+        need_requests = 1 + reserve * self.rpm
+        need_tokens = min(cost, self.tpm) + reserve * self.tpm
+        wait = max(
+            (need_requests - self.requests) * 60 / self.rpm,
+            (need_tokens - self.tokens) * 60 / self.tpm,
+        )
+        if wait > 0:
+            return wait
+        self.requests -= 1
+        self.tokens -= cost
+        self.inflight += 1
+        return 0.0
+
+
+class OpenAILimiter:
+    def __init__(self, rpm: int = OPENAI_RPM_LIMIT, tpm: int = OPENAI_TPM_LIMIT):
+        self.rpm, self.tpm = rpm, tpm
+        self._budgets: dict[str, _Budget] = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, model: str) -> _Budget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            budget = self._budgets.setdefault(model, _Budget(self.rpm, self.tpm))
+        return budget
+
+    def _try(self, model: str, cost: int, priority: str, deadline: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = self._budget(model).wait(cost, priority, now)
+        if wait and now + wait > deadline:
+            raise RateLimitTimeout(f"OpenAI {model} budget exhausted; no slot before the deadline.")
+        return wait
+
+    def _waiting(self, model: str, priority: str, delta: int) -> None:
+        if priority == ONLINE:
+            with self._lock:
+                self._budget(model).online_waiting += delta
+
+    def acquire(self, model: str, cost: int, priority: str, deadline: float) -> None:
+        start = time.monotonic()
+        self._waiting(model, priority, 1)
+        try:
+            while (wait := self._try(model, cost, priority, deadline)) > 0:
+                time.sleep(wait)
+        finally:
+            self._waiting(model, priority, -1)
+        OPENAI_LIMITER_WAIT.observe(time.monotonic() - start, priority)
+
+    async def acquire_async(self, model: str, cost: int, priority: str, deadline: float) -> None:
+        start = time.monotonic()
+        self._waiting(model, priority, 1)
+        try:
+            while (wait := self._try(model, cost, priority, deadline)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self._waiting(model, priority, -1)
+        OPENAI_LIMITER_WAIT.observe(time.monotonic() - start, priority)
+
+    def release(self, model: str, cost: int, used: Optional[int], error: Optional[BaseException]) -> None:
+        """Return the slot; refund the estimate against actual usage and adapt concurrency."""
+        with self._lock:
+            budget = self._budget(model)
+            budget.inflight = max(0, budget.inflight - 1)
+            if used is not None:
+                budget.tokens = min(budget.tpm, budget.tokens + cost - used)
+            if isinstance(error, openai.RateLimitError):
+                budget.cap = max(1.0, budget.cap / 2)
+                hinted = retry_after(error.response.headers) or OPENAI_BACKOFF_BASE_S
+                pause = min(hinted, OPENAI_BACKOFF_MAX_S)     # a full-minute reset would outlast the deadline
+                budget.paused_until = max(budget.paused_until, time.monotonic() + pause)
+            elif error is None:
+                budget.cap = min(float(OPENAI_MAX_CONCURRENCY), budget.cap + 1 / budget.cap)
+
+    def observe_headers(self, model: Optional[str], headers) -> None:
+        """Align the model's budget with the server's view of the (shared) quota."""
+        if model is None or "x-ratelimit-limit-requests" not in headers:
+            return
+        try:
+            limit_r = float(headers["x-ratelimit-limit-requests"])
+            limit_t = float(headers.get("x-ratelimit-limit-tokens", 0)) or None
+            remaining_r = float(headers.get("x-ratelimit-remaining-requests", limit_r))
+            remaining_t = headers.get("x-ratelimit-remaining-tokens")
+        except ValueError:
+            return
+        with self._lock:
+            budget = self._budget(model)
+            budget.refill(time.monotonic())
+            budget.rpm = limit_r
+            budget.requests = min(budget.requests, remaining_r)
+            if limit_t:
+                budget.tpm = limit_t
+                if remaining_t is not None:
+                    budget.tokens = min(budget.tokens, float(remaining_t))
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                m: {"rpm": b.rpm, "tpm": b.tpm, "requests": round(b.requests, 1),
+                    "tokens": round(b.tokens), "concurrency": round(b.cap, 1), "inflight": b.inflight}
+                for m, b in self._budgets.items()
+            }
+
+
+limiter = OpenAILimiter()
+
+
+# ── client integration ────────────────────────────────────────────────────
+def backoff(attempt: int, error: BaseException) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's hint (up to OPENAI_BACKOFF_MAX_S)."""
+    delay = random.uniform(0, min(OPENAI_BACKOFF_MAX_S, OPENAI_BACKOFF_BASE_S * 2 ** attempt))
+    response = getattr(error, "response", None)
+    hinted = retry_after(response.headers) if response is not None else None
+    return max(delay, min(hinted or 0.0, OPENAI_BACKOFF_MAX_S))
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _retry_or_raise(model: str, attempt: int, error: BaseException, deadline: float) -> float:
+    delay = backoff(attempt, error)
+    if time.monotonic() + delay > deadline:
+        raise error
+    OPENAI_RETRIES.inc(model, type(error).__name__)
+    logger.warning("OpenAI %s failed (%s); retry %d in %.2fs", model, type(error).__name__, attempt + 1, delay)
+    return delay
+
+
+def _wrap(create: Callable, op: str, priority: str, deadline_s: float, asynchronous: bool) -> Callable:
+    if asynchronous:
+        @functools.wraps(create)
+        async def wrapper(*args, **kwargs):
+            model, cost = kwargs.get("model", "unknown"), estimate_tokens(op, kwargs)
+            deadline = time.monotonic() + deadline_s
+            for attempt in itertools.count():
+                await limiter.acquire_async(model, cost, priority, deadline)
+                token = _current_model.set(model)
+                try:
+                    response = await create(*args, **kwargs)
+                except RETRYABLE as exc:
+                    limiter.release(model, cost, None, exc)
+                    await asyncio.sleep(_retry_or_raise(model, attempt, exc, deadline))
+                    continue
+                except BaseException as exc:
+                    limiter.release(model, cost, None, exc)
+                    raise
+                finally:
+                    _current_model.reset(token)
+                limiter.release(model, cost, _used_tokens(response), None)
+                return response
+    else:
+        @functools.wraps(create)
+        def wrapper(*args, **kwargs):
+            model, cost = kwargs.get("model", "unknown"), estimate_tokens(op, kwargs)
+            deadline = time.monotonic() + deadline_s
+            for attempt in itertools.count():
+                limiter.acquire(model, cost, priority, deadline)
+                token = _current_model.set(model)
+                try:
+                    response = create(*args, **kwargs)
+                except RETRYABLE as exc:
+                    limiter.release(model, cost, None, exc)
+                    time.sleep(_retry_or_raise(model, attempt, exc, deadline))
+                    continue
+                except BaseException as exc:
+                    limiter.release(model, cost, None, exc)
+                    raise
+                finally:
+                    _current_model.reset(token)
+                limiter.release(model, cost, _used_tokens(response), None)
+                return response
+
+    wrapper._rate_limited = True
+    return wrapper
+
+
+def limit_openai(client, priority: str = ONLINE):
+    """Route a client's chat and embedding calls through the shared limiter (use with max_retries=0)."""
+    deadline_s = OPENAI_RETRY_DEADLINE_S if priority == ONLINE else OPENAI_BACKGROUND_RETRY_DEADLINE_S
+    asynchronous = isinstance(client, openai.AsyncOpenAI)
+    for resource, op in ((client.chat.completions, "chat"), (client.embeddings, "embeddings")):
+        if not getattr(resource.create, "_rate_limited", False):
+            resource.create = _wrap(resource.create, op, priority, deadline_s, asynchronous)
+    return client
+
+
+def _observe(response) -> None:
+    limiter.observe_headers(_current_model.get(), response.headers)
+
+
+async def _aobserve(response) -> None:
+    _observe(response)
+
+
+def header_hooks(asynchronous: bool) -> dict:
+    """httpx `event_hooks` that report every response's rate-limit headers."""
+    return {"response": [_aobserve if asynchronous else _observe]}
@@ -0,0 +1,236 @@
+"""
+Process-wide upstream clients and their lifecycle.
+
+One place builds, shares and closes every long-lived connection:
+
+  • OpenAI – one async and one sync client, each over a pooled httpx
+    client (keep-alive, bounded pool, explicit timeouts; HTTP/2 with
+    HTTP2_ENABLED=true when `h2` is installed). Clarifier, embeddings and
+    ingest enrichment all reuse them, so TLS handshakes happen once per
+    pooled connection instead of per call site. Both go through the shared
+    rate limiter (`agent_service.rate_limit`): async = online priority,
+    sync = background (ingest, which runs in its own process and only
+    builds the sync client there).
+  • Weaviate – one async client (REST + gRPC channel) for the agent service.
+    While the FastAPI lifespan is running a background probe checks
+    readiness every WEAVIATE_HEALTH_CHECK_S and reconnects when it fails.
+
+Clients are created lazily on first use, so scripts and benchmarks work
+without a lifespan; `lifespan` warms them up at startup and closes them on
+shutdown.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+from typing import Optional
+
+import httpx
+import weaviate
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.config import ConnectionConfig
+
+from agent_service.graph.metrics import instrument_openai
+from agent_service.rate_limit import BACKGROUND, ONLINE, header_hooks, limit_openai
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# ── HTTP pool ─────────────────────────────────────────────────────────────
+HTTP_MAX_CONNECTIONS    = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE      = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "90"))
+HTTP_CONNECT_TIMEOUT_S  = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_READ_TIMEOUT_S     = float(os.getenv("HTTP_READ_TIMEOUT_S", "60"))
+HTTP_POOL_TIMEOUT_S     = float(os.getenv("HTTP_POOL_TIMEOUT_S", "10"))
+HTTP2_ENABLED           = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# ── Weaviate ──────────────────────────────────────────────────────────────
+WEAVIATE_URL             = os.getenv("WEAVIATE_URL", "weaviate")
+WEAVIATE_QUERY_TIMEOUT_S = float(os.getenv("WEAVIATE_QUERY_TIMEOUT_S", "30"))
+WEAVIATE_HEALTH_CHECK_S  = float(os.getenv("WEAVIATE_HEALTH_CHECK_S", "15"))
+WEAVIATE_POOL_MAXSIZE    = int(os.getenv("WEAVIATE_POOL_MAXSIZE", str(HTTP_MAX_CONNECTIONS)))
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        HTTP_READ_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S, pool=HTTP_POOL_TIMEOUT_S,
+    )
+
+
+def _http2() -> bool:
+    if HTTP2_ENABLED and find_spec("h2") is None:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing; using HTTP/1.1")
+        return False
+    return HTTP2_ENABLED
+
+
+def async_http_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(limits=http_limits(), timeout=http_timeout(), http2=_http2(), **kwargs)
+
+
+def sync_http_client(**kwargs) -> httpx.Client:
+    return httpx.Client(limits=http_limits(), timeout=http_timeout(), http2=_http2(), **kwargs)
+
+
+def openai_api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY environment variable is not set.")
+    return api_key
+
+
+class Resources:
+    """Lazily built shared clients; see the module docstring."""
+
+    def __init__(self):
+        self._openai: Optional[AsyncOpenAI] = None
+        self._openai_sync: Optional[OpenAI] = None
+        self._weaviate: Optional[weaviate.WeaviateAsyncClient] = None
+        self._lock = threading.Lock()
+        self._weaviate_lock = asyncio.Lock()
+        self._probe: Optional[asyncio.Task] = None
+
+    # ── OpenAI ────────────────────────────────────────────────────────
+    def openai(self) -> AsyncOpenAI:
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    client = AsyncOpenAI(
+                        api_key=openai_api_key(), timeout=http_timeout(), max_retries=0,
+                        http_client=async_http_client(event_hooks=header_hooks(asynchronous=True)),
+                    )
+                    # retries live in the limiter; metrics see every attempt
+                    self._openai = limit_openai(instrument_openai(client), ONLINE)
+        return self._openai
+
+    def openai_sync(self) -> OpenAI:
+        if self._openai_sync is None:
+            with self._lock:
+                if self._openai_sync is None:
+                    client = OpenAI(
+                        api_key=openai_api_key(), timeout=http_timeout(), max_retries=0,
+                        http_client=sync_http_client(event_hooks=header_hooks(asynchronous=False)),
+                    )
+                    # the sync client serves ingest: background priority
+                    self._openai_sync = limit_openai(instrument_openai(client), BACKGROUND)
+        return self._openai_sync
+
+    # ── Weaviate ──────────────────────────────────────────────────────
+    async def weaviate(self) -> weaviate.WeaviateAsyncClient:
+        """The shared async client, connecting on first use (or after a failed probe)."""
+        async with self._weaviate_lock:
+            if self._weaviate is None:
+                client = weaviate.use_async_with_local(
+                    WEAVIATE_URL,
+                    additional_config=AdditionalConfig(
+                        connection=ConnectionConfig(session_pool_maxsize=WEAVIATE_POOL_MAXSIZE),
+                        timeout=Timeout(init=HTTP_CONNECT_TIMEOUT_S, query=WEAVIATE_QUERY_TIMEOUT_S),
+                    ),
+                )
+                try:
+                    await client.connect()
+                except Exception as exc:
+                    raise RuntimeError("Could not connect to Weaviate.\n" + str(exc)) from exc
+                self._weaviate = client
+        return self._weaviate
+
+    async def _healthy(self) -> bool:
+        client = self._weaviate
+        if client is None:
+            return True
+        try:
+            return client.is_connected() and await asyncio.wait_for(client.is_ready(), HTTP_CONNECT_TIMEOUT_S)
+        except Exception as exc:
+            logger.warning("Weaviate health probe failed: %s", exc)
+            return False
+
+    async def _drop_weaviate(self) -> None:
+        async with self._weaviate_lock:
+            client, self._weaviate = self._weaviate, None
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as exc:
+                logger.warning("Closing Weaviate client failed: %s", exc)
+
+    async def _probe_weaviate(self) -> None:
+        while True:
+            await asyncio.sleep(WEAVIATE_HEALTH_CHECK_S)
+            if not await self._healthy():
+                logger.warning("Weaviate unhealthy; reconnecting")
+                await self._drop_weaviate()
+                try:
+                    await self.weaviate()
+                except RuntimeError as exc:
+                    logger.warning("%s", exc)          # retried on the next probe / request
+
+    # ── lifecycle ─────────────────────────────────────────────────────
+    async def start(self, connect_weaviate: bool = True) -> None:
+        """
+        Build the service's clients up front; Weaviate failures are logged and
+        retried lazily. The sync client is left to the ingest scripts that use it.
+        """
+        self.openai()
+        if connect_weaviate:
+            try:
+                await self.weaviate()
+            except RuntimeError as exc:
+                logger.warning("%s", exc)
+            if WEAVIATE_HEALTH_CHECK_S > 0:
+                self._probe = asyncio.create_task(self._probe_weaviate())
+
+    async def aclose(self) -> None:
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+        await self._drop_weaviate()
+        with self._lock:
+            client, self._openai = self._openai, None
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as exc:
+                logger.warning("Closing OpenAI client failed: %s", exc)
+        self.close_sync()
+
+    def close_sync(self) -> None:
+        """Close the sync OpenAI client (all a script like the ingestor opens here)."""
+        with self._lock:
+            client, self._openai_sync = self._openai_sync, None
+        if client is not None:
+            client.close()
+
+
+resources = Resources()
+
+
+@asynccontextmanager
+async def lifespan(app, connect_weaviate: bool = True):
+    """FastAPI lifespan: warm up the shared clients, close them on shutdown."""
+    await resources.start(connect_weaviate)
+    logger.info("Shared clients ready")
+    try:
+        yield
+    finally:
+        await resources.aclose()
+        logger.info("Shared clients closed")
@@ -0,0 +1,114 @@
+"""
+Compact, fast-serialized responses for the query endpoints.
+
+By default a response carries only what a client renders: the parsed query,
+clarification flags and the list-view fields of each company. Heavier
+parts are opt-in field groups (`include`):
+
+  • details – every property the retriever returned, not just the list
+              view (full records come from `/company/{ticker}`)
+  • vectors – the query embedding (`near_vector`)
+  • debug   – the Weaviate filter, speculative-retrieval flag, scored candidates
+
+Bodies are encoded with orjson – or MessagePack when the client sends
+`Accept: application/msgpack` – and gzip-compressed above
+RESPONSE_GZIP_MIN_BYTES when the client accepts it.
+"""
+
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Any, Literal, Optional
+
+import orjson
+import ormsgpack
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from agent_service.graph.nodes.retriever import RETURN_PROPERTIES
+from ingestor.doc_store import list_summary
+
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL     = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+
+FieldGroup = Literal["details", "vectors", "debug"]
+
+# company fields rendered in result lists
+LIST_FIELDS = (*(RETURN_PROPERTIES or (
+    "ticker", "name", "sector", "country", "themes",
+    "market_cap_musd", "ebitda_musd", "rev_growth_pct", "summary",
+)), "_relevance")
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+class QueryResponse(BaseModel):
+    """Shape of `/query` bodies (documentation only – built as plain dicts)."""
+    structured_query: Optional[dict] = None
+    need_clarification: bool = False
+    theme_suggestions: list[str] = []
+    budget: Optional[float] = None
+    retrieved_docs: list[dict] = []
+    error: Optional[Any] = None
+    near_vector: Optional[list[float]] = None        # include=vectors
+    debug: Optional[dict] = None                     # include=debug
+
+
+def compact_doc(doc: dict, include: frozenset[str] = frozenset()) -> dict:
+    if "details" in include:
+        return doc
+    out = {k: doc[k] for k in LIST_FIELDS if k in doc}
+    # the retriever's projection already does this; needed for RETRIEVAL_RETURN_PROPERTIES=*
+    if not out.get("summary") and doc.get("description"):
+        out["summary"] = list_summary(doc)
+    return out
+
+
+def build_response(state: dict, include: frozenset[str] = frozenset()) -> dict:
+    """The response payload for a final graph state."""
+    body = {
+        "structured_query": state.get("structured_query"),
+        "need_clarification": state.get("need_clarification", False),
+        "theme_suggestions": state.get("theme_suggestions") or [],
+        "budget": state.get("budget"),
+        "retrieved_docs": [compact_doc(d, include) for d in state.get("retrieved_docs") or []],
+        "error": state.get("error"),
+    }
+    if "vectors" in include:
+        body["near_vector"] = state.get("near_vector")
+    if "debug" in include:
+        where = state.get("where_filter")
+        body["debug"] = {
+            "where_filter": None if where is None else str(where),
+            "speculative_hit": state.get("speculative_hit", False),
+            "scored_candidates": state.get("scored_candidates") or [],
+        }
+    return body
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(t in accept for t in MSGPACK_TYPES)
+
+
+def dumps(payload: Any) -> bytes:
+    """orjson with numpy scalars / arrays and non-str keys (e.g. Weaviate property types)."""
+    return orjson.dumps(payload, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def encode(payload: Any, request: Request, status_code: int = 200) -> Response:
+    """Serialize `payload` for `request` (JSON or MessagePack, gzip above the threshold)."""
+    if wants_msgpack(request):
+        body = ormsgpack.packb(
+            payload, default=str, option=ormsgpack.OPT_SERIALIZE_NUMPY | ormsgpack.OPT_NON_STR_KEYS,
+        )
+        media_type = MSGPACK_TYPES[0]
+    else:
+        body, media_type = dumps(payload), "application/json"
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= RESPONSE_GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,143 @@
+"""
+Record / replay stand-in for the OpenAI HTTP API.
+
+A small HTTP server on 127.0.0.1 that the service's OpenAI clients are
+pointed at through OPENAI_BASE_URL. Requests are keyed by path + canonical
+JSON body, so the same prompt or embedding input always maps to the same
+recorded response.
+
+  • replay – answer from the recordings file; unknown requests get a 404
+  • record – replay when possible, otherwise forward upstream and append
+  • live   – always forward upstream, record nothing
+
+Every request's `usage` block is kept so the runner can attribute token
+counts to the query that caused them. API keys are never written out.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+UPSTREAM_URL = os.getenv("OPENAI_UPSTREAM_URL", "https://api.openai.com/v1")
+MODES = ("replay", "record", "live")
+
+
+def request_key(path: str, body: bytes) -> str:
+    try:
+        canonical = json.dumps(json.loads(body or b"{}"), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = body.decode("utf-8", "replace")
+    return hashlib.sha256(f"{path}\n{canonical}".encode()).hexdigest()
+
+
+class Recorder:
+    def __init__(self, path: str, mode: str = "replay", replay_latency: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}; expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.entries: dict[str, dict] = {}
+        self.calls: list[dict] = []          # usage per request since the last reset
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._http = httpx.Client(timeout=120)
+        if mode != "live" and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def reset(self) -> list[dict]:
+        """Return and clear the calls seen since the previous reset."""
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+    def handle(self, path: str, body: bytes, headers: dict) -> tuple[int, bytes]:
+        key = request_key(path, body)
+        entry = self.entries.get(key) if self.mode != "live" else None
+        source = "replay"
+        if entry is None:
+            if self.mode == "replay":
+                with self._lock:
+                    self.misses += 1
+                message = f"No recorded response for {path} (key {key[:12]}); run with --openai record"
+                return 404, json.dumps({"error": {"message": message, "type": "replay_miss"}}).encode()
+            entry = self._forward(key, path, body, headers)
+            source = self.mode
+        elif self.replay_latency:
+            time.sleep(entry.get("elapsed_ms", 0) / 1000)
+
+        with self._lock:
+            self.calls.append({
+                "path": path,
+                "source": source,
+                "status": entry["status"],
+                "usage": (entry["response"] or {}).get("usage") or {},
+            })
+        return entry["status"], json.dumps(entry["response"]).encode()
+
+    def _forward(self, key: str, path: str, body: bytes, headers: dict) -> dict:
+        upstream = UPSTREAM_URL.rstrip("/") + path.removeprefix("/v1")
+        t0 = time.perf_counter()
+        response = self._http.post(upstream, content=body, headers={
+            "Authorization": headers.get("Authorization", ""),
+            "Content-Type": "application/json",
+        })
+        entry = {
+            "key": key,
+            "path": path,
+            "status": response.status_code,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "response": response.json(),
+        }
+        if self.mode == "record" and response.status_code == 200:
+            with self._lock:
+                self.entries[key] = entry
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
+
+
+def serve(recorder: Recorder) -> tuple[ThreadingHTTPServer, str]:
+    """Start the stand-in on a free local port; returns (server, base_url)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            status, payload = recorder.handle(self.path, body, dict(self.headers))
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def tokens(calls: list[dict]) -> dict:
+    """Sum the usage blocks of `calls` into chat / embedding token counts."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "embedding_tokens": 0, "requests": len(calls)}
+    for call in calls:
+        usage = call["usage"]
+        if call["path"].endswith("/embeddings"):
+            totals["embedding_tokens"] += usage.get("prompt_tokens", 0)
+        else:
+            totals["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            totals["completion_tokens"] += usage.get("completion_tokens", 0)
+    return totals
@@ -0,0 +1,330 @@
+"""
+Retrieval quality and latency benchmark for the screening graph.
+
+Runs every screen in the golden set through `build_graph.build_engine()`
+with the OpenAI API replaced by the record/replay stand-in and, by default,
+the in-process retrieval backend (doc store, or the legacy my_docs.json).
+Reported per query and in aggregate:
+
+  • per-node latency (Parser / Enricher / Retriever) and end-to-end
+  • recall@k and nDCG@k against the expected tickers
+  • filter accuracy of the parsed StructuredQuery
+  • chat and embedding token usage
+
+    python -m benchmarks.run run --openai record      # first, needs OPENAI_API_KEY
+    python -m benchmarks.run run --output base.json   # offline from then on
+    python -m benchmarks.run compare base.json new.json
+
+Recordings (benchmarks/recordings.jsonl) are not committed: record them
+once against your key. Replay refuses to run without them, and any request
+missing from them fails the run instead of being scored as a miss. The
+local backend needs an enriched corpus (themes set) – point --doc-store at
+the output of a real ingest; the legacy my_docs.json carries no themes, so
+themed screens could never match.
+
+Parse and search caches are cleared before every query so each run does
+the full amount of work; the embedding cache is disabled unless asked for.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from .openai_replay import MODES, Recorder, serve, tokens
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_SET_PATH = os.path.join(HERE, "golden_set.jsonl")
+RECORDINGS_PATH = os.path.join(HERE, "recordings.jsonl")
+
+FILTER_FIELDS = ("theme", "country", "ebitda_min", "rev_growth_min", "market_cap_min")
+NODES = ("Parser", "Enricher", "Retriever")
+
+
+# ── scoring ───────────────────────────────────────────────────────────────
+def recall_at_k(retrieved: list[str], expected: list[str], k: int) -> float:
+    return len(set(retrieved[:k]) & set(expected)) / len(expected)
+
+
+def ndcg_at_k(retrieved: list[str], expected: list[str], k: int) -> float:
+    relevant = set(expected)
+    dcg = sum(1 / math.log2(i + 2) for i, t in enumerate(retrieved[:k]) if t in relevant)
+    ideal = sum(1 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / ideal
+
+
+def _same(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, (int, float)) or isinstance(actual, (int, float)):
+        return math.isclose(float(expected or 0), float(actual or 0), rel_tol=1e-6)
+    return (expected or "").strip().lower() == (actual or "").strip().lower()
+
+
+def filter_accuracy(expected: dict, structured: Optional[dict]) -> dict[str, bool]:
+    """Per-field match; fields absent from `expected` must come back empty."""
+    structured = structured or {}
+    return {f: _same(expected.get(f), structured.get(f)) for f in FILTER_FIELDS}
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "mean": round(float(np.mean(values)), 2),
+    }
+
+
+def _mean(values: list[float]) -> Optional[float]:
+    return round(float(np.mean(values)), 4) if values else None
+
+
+# ── running ───────────────────────────────────────────────────────────────
+def load_golden(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def run_case(engine, case: dict, recorder: Recorder, k: int) -> dict:
+    from agent_service.graph.state import InvestorState
+    from agent_service.graph.result_cache import parse_cache, search_cache
+
+    parse_cache.clear()
+    search_cache.clear()
+    recorder.reset()
+    misses_before = recorder.misses
+
+    node_ms: dict[str, float] = {}
+    state: dict = {}
+    error = None
+    start = previous = time.perf_counter()
+    try:
+        async for mode, chunk in engine.astream(
+            InvestorState(user_query=case["query"]), stream_mode=["updates", "values"]
+        ):
+            now = time.perf_counter()
+            if mode == "updates":
+                for node in chunk:
+                    node_ms[node] = round((now - previous) * 1000, 2)
+                previous = now
+            else:
+                state = chunk if isinstance(chunk, dict) else chunk.model_dump()
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    total_ms = round((time.perf_counter() - start) * 1000, 2)
+    replay_misses = recorder.misses - misses_before
+    if replay_misses:
+        error = f"{replay_misses} OpenAI request(s) missing from the recordings"
+
+    retrieved = [d.get("ticker") for d in state.get("retrieved_docs") or []]
+    expected = case.get("expected_tickers") or []
+    fields = filter_accuracy(case.get("expected_filters") or {}, state.get("structured_query"))
+    row = {
+        "id": case["id"],
+        "query": case["query"],
+        "error": error,
+        "latency_ms": {**node_ms, "total": total_ms},
+        "tokens": tokens(recorder.reset()),
+        "need_clarification": bool(state.get("need_clarification")),
+        "clarification_ok": bool(state.get("need_clarification")) == bool(case.get("expect_clarification")),
+        "filters": fields,
+        "filters_exact": all(fields.values()),
+        "retrieved": retrieved[:k],
+        "expected": expected,
+    }
+    if expected and not replay_misses:      # a replay miss says nothing about retrieval quality
+        row[f"recall@{k}"] = round(recall_at_k(retrieved, expected, k), 4)
+        row[f"ndcg@{k}"] = round(ndcg_at_k(retrieved, expected, k), 4)
+    return row
+
+
+def summarize(rows: list[dict], k: int, misses: int) -> dict:
+    scored = [r for r in rows if f"recall@{k}" in r]
+    latency = {
+        node: _percentiles([r["latency_ms"][node] for r in rows if node in r["latency_ms"]])
+        for node in NODES + ("total",)
+    }
+    token_totals = {key: sum(r["tokens"][key] for r in rows) for key in rows[0]["tokens"]} if rows else {}
+    return {
+        "queries": len(rows),
+        "errors": sum(r["error"] is not None for r in rows),
+        "replay_misses": misses,
+        f"recall@{k}": _mean([r[f"recall@{k}"] for r in scored]),
+        f"ndcg@{k}": _mean([r[f"ndcg@{k}"] for r in scored]),
+        "filters_exact": _mean([r["filters_exact"] for r in rows]),
+        "filter_field_accuracy": _mean([v for r in rows for v in r["filters"].values()]),
+        "clarification_accuracy": _mean([r["clarification_ok"] for r in rows]),
+        "latency_ms": {node: stats for node, stats in latency.items() if stats},
+        "tokens": token_totals,
+        "tokens_per_query": {key: round(v / len(rows), 1) for key, v in token_totals.items()} if rows else {},
+    }
+
+
+def _git_revision() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def configure_env(args: argparse.Namespace, base_url: str) -> None:
+    """Point the service at the stand-ins. Must run before agent_service is imported."""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    if args.openai == "replay":
+        os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+    elif not os.getenv("OPENAI_API_KEY"):
+        sys.exit(f"--openai {args.openai} needs OPENAI_API_KEY")
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ["FAST_PARSE_LOG"] = ""
+    if args.doc_store:
+        os.environ["DOC_STORE_PATH"] = args.doc_store
+    if not args.embed_cache:
+        os.environ["EMBED_CACHE_PATH"] = ""
+    if args.fast_parse is not None:
+        os.environ["FAST_PARSE_ENABLED"] = "true" if args.fast_parse else "false"
+
+
+def check_corpus(golden: list[dict]) -> None:
+    """Refuse a local corpus that cannot satisfy themed screens (e.g. the un-enriched my_docs.json)."""
+    from agent_service.graph.local_index import get_local_index
+
+    index, _ = get_local_index()
+    if any((c.get("expected_filters") or {}).get("theme") for c in golden) and not index.postings.get("themes"):
+        sys.exit(
+            "The local corpus has no themes, so every themed screen would score 0. "
+            "Run an ingest (python -m ingestor.ingest) and pass its store with --doc-store."
+        )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    if args.openai == "replay" and not os.path.exists(args.recordings):
+        sys.exit(f"No recordings at {args.recordings}; run once with --openai record (needs OPENAI_API_KEY).")
+    recorder = Recorder(args.recordings, args.openai, args.replay_latency)
+    server, base_url = serve(recorder)
+    configure_env(args, base_url)
+
+    from agent_service.graph.build_graph import build_engine
+
+    golden = load_golden(args.golden)
+    if args.only:
+        golden = [c for c in golden if c["id"] in args.only]
+    if args.backend == "local":
+        check_corpus(golden)
+    engine = build_engine()
+
+    rows = []
+    try:
+        for _ in range(args.repeat):
+            for case in golden:
+                rows.append(await run_case(engine, case, recorder, args.k))
+    finally:
+        server.shutdown()
+
+    return {
+        "meta": {
+            **_git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "openai": args.openai,
+            "backend": args.backend,
+            "k": args.k,
+            "repeat": args.repeat,
+            "golden_set": os.path.relpath(args.golden),
+        },
+        "summary": summarize(rows, args.k, recorder.misses),
+        "queries": rows,
+    }
+
+
+# ── reporting ─────────────────────────────────────────────────────────────
+def _flatten(d: dict, prefix: str = "") -> dict[str, float]:
+    flat: dict[str, float] = {}
+    for key, value in d.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_report(result: dict) -> None:
+    k = result["meta"]["k"]
+    for r in result["queries"]:
+        status = r["error"] or ("clarify" if r["need_clarification"] else f"{len(r['retrieved'])} hits")
+        recall = r.get(f"recall@{k}")
+        print(
+            f"{r['id']:>5}  {r['latency_ms']['total']:8.1f} ms  "
+            f"recall={'-' if recall is None else f'{recall:.2f}'}  "
+            f"filters={'ok' if r['filters_exact'] else 'MISS'}  {status}"
+        )
+    print()
+    for name, value in _flatten(result["summary"]).items():
+        print(f"{name:40s} {value}")
+
+
+def compare(base_path: str, new_path: str) -> None:
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base {base['meta'].get('commit')}  →  new {new['meta'].get('commit')}")
+    old, cur = _flatten(base["summary"]), _flatten(new["summary"])
+    for name in sorted(set(old) | set(cur)):
+        a, b = old.get(name), cur.get(name)
+        delta = ""
+        if a is not None and b is not None:
+            delta = f"{b - a:+.4g}" + (f" ({(b - a) / a:+.1%})" if a else "")
+        print(f"{name:40s} {a!s:>12} {b!s:>12}  {delta}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Screening quality / latency benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rn = sub.add_parser("run", help="Run the golden set through the graph")
+    rn.add_argument("--golden", default=GOLDEN_SET_PATH)
+    rn.add_argument("--recordings", default=RECORDINGS_PATH)
+    rn.add_argument("--openai", choices=MODES, default="replay",
+                    help="replay recorded responses, record missing ones, or call the API live")
+    rn.add_argument("--replay-latency", action="store_true",
+                    help="Sleep for the recorded upstream latency when replaying")
+    rn.add_argument("--backend", choices=("local", "weaviate"), default="local")
+    rn.add_argument("--doc-store", help="Doc store directory for the local backend")
+    rn.add_argument("--fast-parse", action=argparse.BooleanOptionalAction, default=None)
+    rn.add_argument("--embed-cache", action="store_true", help="Keep the on-disk embedding cache enabled")
+    rn.add_argument("--k", type=int, default=10)
+    rn.add_argument("--repeat", type=int, default=1)
+    rn.add_argument("--only", nargs="*", help="Golden-set ids to run")
+    rn.add_argument("--output", help="Write results as JSON")
+    cp = sub.add_parser("compare", help="Diff the summaries of two result files")
+    cp.add_argument("base")
+    cp.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.base, args.new)
+        return
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    misses = result["summary"]["replay_misses"]
+    if misses:
+        sys.exit(f"{misses} OpenAI request(s) had no recording; re-run with --openai record to add them.")
+
+
+if __name__ == "__main__":
+    main()
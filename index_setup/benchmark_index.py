@@ -0,0 +1,163 @@
+"""
+Benchmark HNSW / quantization settings against exact search.
+
+For every configuration a scratch collection is created, loaded with the
+corpus vectors and queried; results are compared with exact cosine top-k
+computed in NumPy. Reported per configuration: recall@k, p50/p99 latency
+and an estimate of index memory.
+
+    python benchmark_index.py --vectors ../ingestor/doc_store/vectors.npy \
+        --config "none" --config "none:ef=32,max_connections=16" \
+        --config "bq:rescore_limit=200" --config "sq" --config "pq:pq_segments=128" \
+        --queries 200 --k 10 --output bench.json
+
+A config is `<quantizer>[:key=value,...]`, keys being the create_index.py
+options with underscores (ef, ef_construction, max_connections, pq_segments,
+pq_centroids, training_limit, rescore_limit, vector_cache_max_objects,
+flat_search_cutoff, filter_strategy).
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import weaviate
+from dotenv import load_dotenv
+from weaviate.classes.config import Configure
+from weaviate.util import generate_uuid5
+
+from create_index import QUANTIZERS, add_index_args, vector_index_config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HNSW_DEFAULT_MAX_CONNECTIONS = 32
+
+
+def parse_config(spec: str, defaults: argparse.Namespace) -> argparse.Namespace:
+    quantizer, _, rest = spec.partition(":")
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer {quantizer!r} in {spec!r}")
+    values = vars(defaults).copy()
+    values["quantizer"] = quantizer
+    for item in filter(None, rest.split(",")):
+        key, _, value = item.partition("=")
+        if key not in values:
+            raise ValueError(f"Unknown option {key!r} in {spec!r}")
+        values[key] = value if key == "filter_strategy" else int(value)
+    values["label"] = spec
+    return argparse.Namespace(**values)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+    scores = q @ unit.T
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+def estimate_memory_mb(cfg: argparse.Namespace, n: int, dim: int) -> float:
+    """Rough resident size: compressed (or full) vectors + HNSW layer-0 links."""
+    if cfg.quantizer == "pq":
+        per_vector = cfg.pq_segments or dim // 4
+    elif cfg.quantizer == "bq":
+        per_vector = dim / 8
+    elif cfg.quantizer == "sq":
+        per_vector = dim
+    else:
+        per_vector = dim * 4
+    links = (cfg.max_connections or HNSW_DEFAULT_MAX_CONNECTIONS) * 2 * 8
+    return n * (per_vector + links) / 1e6
+
+
+def run_config(client, cfg, name, vectors, queries, truth, k) -> dict:
+    if client.collections.exists(name):
+        client.collections.delete(name)
+    collection = client.collections.create(
+        name=name,
+        vectorizer_config=Configure.Vectorizer.none(),
+        vector_index_config=vector_index_config(cfg),
+    )
+    t0 = time.monotonic()
+    with collection.batch.fixed_size(batch_size=200, concurrent_requests=2) as batch:
+        for i, vector in enumerate(vectors):
+            batch.add_object(properties={"row": i}, vector=vector.tolist(), uuid=generate_uuid5(i))
+    if collection.batch.failed_objects:
+        raise RuntimeError(f"{len(collection.batch.failed_objects)} objects failed to import")
+    import_s = time.monotonic() - t0
+
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t = time.perf_counter()
+        response = collection.query.near_vector(near_vector=q.tolist(), limit=k,
+                                                return_properties=["row"])
+        latencies.append((time.perf_counter() - t) * 1000)
+        got = {int(o.properties["row"]) for o in response.objects}
+        recalls.append(len(got & set(expected.tolist())) / k)
+
+    return {
+        "config": cfg.label,
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "est_index_mb": round(estimate_memory_mb(cfg, len(vectors), vectors.shape[1]), 1),
+        "import_s": round(import_s, 1),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark vector index configurations")
+    parser.add_argument("--vectors", required=True, help="float32 .npy matrix (e.g. doc store vectors.npy)")
+    parser.add_argument("--config", action="append", default=[], help="Configuration to test (repeatable)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query vectors")
+    parser.add_argument("--noise", type=float, default=0.05,
+                        help="Gaussian noise added to sampled queries, so they are not exact copies")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="IndexBench")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--output", help="Write results as JSON")
+    add_index_args(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    load_dotenv()
+    args = parse_args()
+    configs = [parse_config(c, args) for c in (args.config or ["none"])]
+
+    vectors = np.asarray(np.load(args.vectors, mmap_mode="r"), dtype=np.float32)
+    vectors = vectors[np.linalg.norm(vectors, axis=1) > 0]
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, args.noise, (len(sample), vectors.shape[1])).astype(np.float32)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    client = weaviate.connect_to_local(os.environ.get("WEAVIATE_URL", "localhost"))
+    results = []
+    try:
+        for i, cfg in enumerate(configs):
+            name = f"{args.prefix}{i}"
+            logger.info("Benchmarking %s as %s", cfg.label, name)
+            try:
+                results.append(run_config(client, cfg, name, vectors, queries, truth, args.k))
+            finally:
+                if not args.keep and client.collections.exists(name):
+                    client.collections.delete(name)
+    finally:
+        client.close()
+
+    for row in results:
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"n_vectors": len(vectors), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,134 @@
 
 from dotenv import load_dotenv
 import argparse
+import json
 import os
 import logging
+from typing import Optional
 
 import weaviate
-from weaviate.classes.config import Property, DataType, Configure, Tokenization
- 
+from weaviate.classes.config import (
+    Property, DataType, Configure, Tokenization, VectorDistances, VectorFilterStrategy,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
- 
+QUANTIZERS = ("none", "pq", "bq", "sq")
+FILTER_STRATEGIES = tuple(s.value for s in VectorFilterStrategy)
+
+# The retriever leaves selective filters to Weaviate's flat search, so the
+# cutoff is always set explicitly: FLAT_SEARCH_SHARE of the ingested corpus,
+# and never below the agent service's EXACT_SEARCH_MAX_OBJECTS (keep in sync).
+DOC_STORE_PATH    = os.environ.get(
+    "DOC_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestor", "doc_store")
+)
+FLAT_SEARCH_MIN   = int(os.environ.get("EXACT_SEARCH_MAX_OBJECTS", "500"))
+FLAT_SEARCH_SHARE = float(os.environ.get("HNSW_FLAT_SEARCH_SHARE", "0.1"))
+
+
+def _env_int(name: str):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def corpus_rows(store_path: str = DOC_STORE_PATH) -> Optional[int]:
+    """Companies in the ingestor's doc store (its index.json), or None before the first ingest."""
+    try:
+        with open(os.path.join(store_path, "index.json")) as f:
+            return len(json.load(f)["tickers"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def default_flat_search_cutoff(rows: Optional[int]) -> int:
+    """Brute-force filters matching up to FLAT_SEARCH_SHARE of `rows` objects (at least FLAT_SEARCH_MIN)."""
+    return max(FLAT_SEARCH_MIN, int((rows or 0) * FLAT_SEARCH_SHARE))
+
+
+def add_index_args(parser: argparse.ArgumentParser) -> None:
+    """HNSW / compression options, shared with benchmark_index.py."""
+    group = parser.add_argument_group("vector index")
+    group.add_argument("--ef", type=int, default=_env_int("HNSW_EF"),
+                       help="Query-time candidate list size (-1 = dynamic)")
+    group.add_argument("--ef-construction", type=int, default=_env_int("HNSW_EF_CONSTRUCTION"),
+                       help="Candidate list size while building the graph")
+    group.add_argument("--max-connections", type=int, default=_env_int("HNSW_MAX_CONNECTIONS"),
+                       help="Graph out-degree per node")
+    group.add_argument("--vector-cache-max-objects", type=int,
+                       default=_env_int("HNSW_VECTOR_CACHE_MAX_OBJECTS"))
+    group.add_argument("--quantizer", choices=QUANTIZERS,
+                       default=os.environ.get("HNSW_QUANTIZER", "none"),
+                       help="Vector compression: product, binary or scalar quantization")
+    group.add_argument("--pq-segments", type=int, default=_env_int("PQ_SEGMENTS"),
+                       help="PQ segments (must divide the vector dimension)")
+    group.add_argument("--pq-centroids", type=int, default=_env_int("PQ_CENTROIDS"))
+    group.add_argument("--training-limit", type=int, default=_env_int("QUANTIZER_TRAINING_LIMIT"),
+                       help="Objects used to train PQ/SQ")
+    group.add_argument("--rescore-limit", type=int, default=_env_int("QUANTIZER_RESCORE_LIMIT"),
+                       help="BQ/SQ: candidates re-scored with full vectors")
+    group.add_argument("--flat-search-cutoff", type=int, default=_env_int("HNSW_FLAT_SEARCH_CUTOFF"),
+                       help="Brute-force the filtered set instead of walking HNSW below this many matches "
+                            "(default: HNSW_FLAT_SEARCH_SHARE of the doc store, at least EXACT_SEARCH_MAX_OBJECTS)")
+    group.add_argument("--filter-strategy", choices=FILTER_STRATEGIES,
+                       default=os.environ.get("HNSW_FILTER_STRATEGY") or None,
+                       help="Filtered HNSW traversal: sweeping, or acorn for restrictive filters")
+
+
+def quantizer_config(args: argparse.Namespace):
+    if args.quantizer == "pq":
+        return Configure.VectorIndex.Quantizer.pq(
+            segments=args.pq_segments,
+            centroids=args.pq_centroids,
+            training_limit=args.training_limit,
+        )
+    if args.quantizer == "bq":
+        return Configure.VectorIndex.Quantizer.bq(rescore_limit=args.rescore_limit)
+    if args.quantizer == "sq":
+        return Configure.VectorIndex.Quantizer.sq(
+            rescore_limit=args.rescore_limit,
+            training_limit=args.training_limit,
+        )
+    return None
+
+
+def vector_index_config(args: argparse.Namespace):
+    return Configure.VectorIndex.hnsw(
+        distance_metric=VectorDistances.COSINE,
+        ef=args.ef,
+        ef_construction=args.ef_construction,
+        max_connections=args.max_connections,
+        vector_cache_max_objects=args.vector_cache_max_objects,
+        flat_search_cutoff=(
+            args.flat_search_cutoff if args.flat_search_cutoff is not None
+            else default_flat_search_cutoff(corpus_rows())
+        ),
+        filter_strategy=VectorFilterStrategy(args.filter_strategy) if args.filter_strategy else None,
+        quantizer=quantizer_config(args),
+    )
+
+
+def collection_properties() -> list[Property]:
+    # Screens filter on themes / country and `> min` on the numeric fields:
+    # those get roaring-bitmap filter indexes (and range indexes for numbers)
+    # but no BM25 index, since they are never keyword-searched.
+    return [
+        Property(name="ticker", data_type=DataType.TEXT),
+        Property(name="name", data_type=DataType.TEXT),
+        Property(name="sector", data_type=DataType.TEXT),
+        Property(name="country", data_type=DataType.TEXT, index_filterable=True, index_searchable=False),
+        Property(name="ebitda_musd", data_type=DataType.NUMBER, index_range_filters=True),
+        Property(name="rev_growth_pct", data_type=DataType.NUMBER, index_range_filters=True),
+        Property(name="market_cap_musd", data_type=DataType.NUMBER, index_range_filters=True),
+        Property(name="description", data_type=DataType.TEXT),
+        # enrichment fields
+        Property(name="summary", data_type=DataType.TEXT, tokenization=Tokenization.WHITESPACE),
+        Property(name="keywords", data_type=DataType.TEXT_ARRAY),
+        Property(name="themes", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD,
+                 index_filterable=True, index_searchable=False),
+    ]
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Create or update a Weaviate collection")
     parser.add_argument(
@@ -18,41 +136,41 @@ def parse_args() -> argparse.Namespace:
         default=os.environ.get("WEAVIATE_COLLECTION"),
         help="Name of the Weaviate collection to create",
     )
+    parser.add_argument(
+        "--keep-existing",
+        action="store_true",
+        help="Leave an existing collection in place (for delta ingestion) instead of dropping it",
+    )
+    add_index_args(parser)
     return parser.parse_args()
- 
-   
+
+
 def main() -> None:
     load_dotenv()
     args = parse_args()
- 
+    if args.flat_search_cutoff is None:
+        args.flat_search_cutoff = default_flat_search_cutoff(corpus_rows())
+
     client = weaviate.connect_to_local()
 
     if client.collections.exists(args.collection_name):
+        if args.keep_existing:
+            logger.info("Collection %s exists, keeping it", args.collection_name)
+            client.close()
+            return
         logger.info("Collection %s exists, deleting", args.collection_name)
         client.collections.delete(args.collection_name)
 
     client.collections.create(
         name=args.collection_name,
-        properties=[
-            Property(name="ticker", data_type=DataType.TEXT),
-            Property(name="name", data_type=DataType.TEXT),
-            Property(name="sector", data_type=DataType.TEXT),
-            Property(name="country", data_type=DataType.TEXT),
-            Property(name="ebitda_musd", data_type=DataType.NUMBER),
-            Property(name="rev_growth_pct", data_type=DataType.NUMBER),
-            Property(name="market_cap_musd", data_type=DataType.NUMBER),
-            Property(name="description", data_type=DataType.TEXT),
-            # enrichment fields
-            Property(name="summary", data_type=DataType.TEXT, tokenization=Tokenization.WHITESPACE),
-            Property(name="keywords", data_type=DataType.TEXT_ARRAY),
-            Property(name="themes", data_type=DataType.TEXT_ARRAY)
-         ],
+        properties=collection_properties(),
         vectorizer_config=Configure.Vectorizer.none(),
-        vector_index_config=Configure.VectorIndex.hnsw()
+        vector_index_config=vector_index_config(args)
         )
-  
-    logger.info("Collection %s created", args.collection_name)
+
+    logger.info("Collection %s created (quantizer=%s, flat_search_cutoff=%d)",
+                args.collection_name, args.quantizer, args.flat_search_cutoff)
     client.close()
- 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
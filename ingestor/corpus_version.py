@@ -0,0 +1,37 @@
+"""
+Corpus version stamp shared by the ingestor and the agent service.
+
+The ingestor writes a fresh stamp into the collection's description after
+every run; readers compare stamps to know when cached results went stale.
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+from typing import Optional
+
+_PATTERN = re.compile(r"\[corpus_version=([^\]]+)\]")
+
+
+def new_version() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+
+
+def stamp_description(description: Optional[str], version: str) -> str:
+    """Return `description` with its corpus stamp replaced by `version`."""
+    base = _PATTERN.sub("", description or "").strip()
+    return f"{base} [corpus_version={version}]".strip()
+
+
+def parse_version(description: Optional[str]) -> Optional[str]:
+    match = _PATTERN.search(description or "")
+    return match.group(1) if match else None
+
+
+def publish(collection, version: Optional[str] = None) -> str:
+    """Stamp a (sync) collection with a new corpus version and return it."""
+    version = version or new_version()
+    current = collection.config.get(simple=True).description
+    collection.config.update(description=stamp_description(current, version))
+    return version
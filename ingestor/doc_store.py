@@ -0,0 +1,211 @@
+"""
+Binary, columnar document store for the ingested corpus.
+
+Layout of a store directory:
+
+    vectors.npy   float32 matrix (rows × dim), opened memory-mapped
+    docs.parquet  every scalar / text / list field, one row per company
+    index.json    {"dim": ..., "tickers": {ticker: row}}
+
+Rows line up across the three files. Nothing is parsed or copied until a
+column or a vector row is actually touched, so the corpus can be opened
+and sliced cheaply however large it grows. Docs read back carry `_vector`
+as a read-only view into the memory-mapped matrix, never as a Python list;
+test it with `has_vector()`, not truthiness.
+
+    python -m ingestor.doc_store convert ingestor/my_docs.json ingestor/doc_store
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Iterable, Iterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+DOC_STORE_PATH = os.getenv(
+    "DOC_STORE_PATH", os.path.join(os.path.dirname(__file__), "doc_store")
+)
+LEGACY_JSON_PATH = os.path.join(os.path.dirname(__file__), "my_docs.json")
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE    = "docs.parquet"
+INDEX_FILE   = "index.json"
+
+VECTOR_KEY   = "_vector"
+EMBEDDING_DIM = 1024
+
+# un-enriched docs (no summary) are listed with the start of their description
+SUMMARY_FALLBACK_CHARS = int(os.getenv("RETRIEVAL_SUMMARY_FALLBACK_CHARS", "600"))
+
+
+class DocStore:
+    """Read-only view over a store directory."""
+
+    def __init__(self, path: str = DOC_STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.dim: int = index["dim"]
+        self.index: dict[str, int] = index["tickers"]
+        self.vectors: np.ndarray = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.table: pa.Table = pq.read_table(os.path.join(path, DOCS_FILE), memory_map=True)
+
+    # ── access ─────────────────────────────────────────────────────────
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.index
+
+    @property
+    def tickers(self) -> list[str]:
+        return self.table.column("ticker").to_pylist()
+
+    def column(self, name: str) -> list:
+        return self.table.column(name).to_pylist()
+
+    def rows(self, tickers: Iterable[str]) -> list[int]:
+        return [self.index[t] for t in tickers]
+
+    def vector(self, ticker: str) -> np.ndarray:
+        return self.vectors[self.index[ticker]]
+
+    def get(self, ticker: str, with_vector: bool = True) -> dict:
+        return self.take([ticker], with_vector)[0]
+
+    def take(self, tickers: Iterable[str], with_vector: bool = True) -> list[dict]:
+        rows = self.rows(tickers)
+        docs = self.table.take(pa.array(rows, type=pa.int64())).to_pylist()
+        if with_vector:
+            for doc, row in zip(docs, rows):
+                doc[VECTOR_KEY] = self.vectors[row] if doc.get("_has_vector") else None
+        return [_clean(d) for d in docs]
+
+    def docs(self, with_vector: bool = True) -> Iterator[dict]:
+        """Every doc in row order; `_vector` is a row view of the mmapped matrix (no copy)."""
+        for row, doc in enumerate(self.table.to_pylist()):
+            if with_vector:
+                doc[VECTOR_KEY] = self.vectors[row] if doc.get("_has_vector") else None
+            yield _clean(doc)
+
+
+def has_vector(doc: dict) -> bool:
+    """True when `doc` carries a non-empty vector (a list or an mmapped row)."""
+    vector = doc.get(VECTOR_KEY)
+    return vector is not None and len(vector) > 0
+
+
+def list_summary(doc: dict) -> str:
+    """`summary`, or the truncated description when enrichment left it empty."""
+    return doc.get("summary") or (doc.get("description") or "")[:SUMMARY_FALLBACK_CHARS]
+
+
+def _clean(doc: dict) -> dict:
+    doc.pop("_has_vector", None)
+    if doc.get(VECTOR_KEY) is None:
+        doc.pop(VECTOR_KEY, None)
+    return doc
+
+
+def write_store(docs: list[dict], path: str = DOC_STORE_PATH, dim: int = EMBEDDING_DIM) -> None:
+    """
+    Write `docs` (dicts that may carry a `_vector` list) as a store at `path`.
+    The directory is built aside and swapped in, so readers never see a
+    half-written store.
+    """
+    # one row per ticker; like an upsert, the last occurrence wins
+    by_ticker = {d["ticker"]: d for d in docs}
+    if len(by_ticker) != len(docs):
+        logger.warning("Dropping %d duplicate ticker row(s)", len(docs) - len(by_ticker))
+        docs = list(by_ticker.values())
+    tickers = list(by_ticker)
+
+    # pyarrow infers the schema from the first row, so give every row every column
+    columns = list(dict.fromkeys(k for d in docs for k in d if k != VECTOR_KEY))
+
+    # rows copied straight from mmapped views / lists into one float32 matrix
+    vectors = np.zeros((len(docs), dim), dtype=np.float32)
+    rows = []
+    for i, d in enumerate(docs):
+        present = has_vector(d)
+        if present:
+            vector = d[VECTOR_KEY]
+            if len(vector) != dim:
+                raise ValueError(f"{d['ticker']}: vector has {len(vector)} dims, expected {dim}.")
+            vectors[i] = vector
+        row = {k: d.get(k) for k in columns}
+        row["_has_vector"] = present
+        rows.append(row)
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".doc_store-", dir=parent)
+    os.chmod(tmp, 0o755)
+    try:
+        np.save(os.path.join(tmp, VECTORS_FILE), vectors)
+        pq.write_table(pa.Table.from_pylist(rows), os.path.join(tmp, DOCS_FILE), compression="zstd")
+        with open(os.path.join(tmp, INDEX_FILE), "w") as f:
+            json.dump({"dim": dim, "tickers": {t: i for i, t in enumerate(tickers)}}, f)
+
+        old = None
+        if os.path.exists(path):
+            old = path + ".old"
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(path, old)
+        os.rename(tmp, path)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    logger.info("Wrote %d documents to %s", len(docs), path)
+
+
+def store_exists(path: str = DOC_STORE_PATH) -> bool:
+    return os.path.exists(os.path.join(path, INDEX_FILE))
+
+
+def load_docs(path: str = DOC_STORE_PATH) -> list[dict]:
+    """All docs (with `_vector` as mmapped rows) from the store, falling back to the legacy JSON file."""
+    if store_exists(path):
+        return list(DocStore(path).docs())
+    if os.path.exists(LEGACY_JSON_PATH):
+        logger.info("No doc store at %s; reading legacy %s", path, LEGACY_JSON_PATH)
+        with open(LEGACY_JSON_PATH) as f:
+            return json.load(f)
+    return []
+
+
+def convert_json(json_path: str, path: str = DOC_STORE_PATH) -> None:
+    """Convert a legacy `my_docs.json` list into a store directory."""
+    with open(json_path) as f:
+        docs = json.load(f)
+    dims = {len(d[VECTOR_KEY]) for d in docs if has_vector(d)}
+    write_store(docs, path, dim=dims.pop() if len(dims) == 1 else EMBEDDING_DIM)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Document store utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="Convert a my_docs.json file into a store")
+    conv.add_argument("json_path", nargs="?", default=LEGACY_JSON_PATH)
+    conv.add_argument("store_path", nargs="?", default=DOC_STORE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_json(args.json_path, args.store_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,232 @@
 import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from dotenv import load_dotenv
-from openai import OpenAI
-import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from agent_service.resources import resources
+from agent_service.graph.single_flight import embed_flight
+from .embed_cache import get_cache
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
  # Retrieve configuration from environment
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY environment variable is not set.")
-
 embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+EMBEDDING_DIM = 1024
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=openai_api_key, http_client=httpx.Client())
+# Batching knobs for embed_many()
+EMBED_BATCH_TOKENS  = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))   # per request
+EMBED_BATCH_SIZE    = int(os.getenv("EMBED_BATCH_SIZE", "256"))        # inputs per request (API max 2048)
+EMBED_CONCURRENCY   = int(os.getenv("EMBED_CONCURRENCY", "4"))         # requests in flight
+MAX_INPUT_TOKENS    = 8191                                             # model limit per input
 
-def embed(txt: str, client: OpenAI = client) -> list:
-    response = client.embeddings.create(
+def _check_vector(embedding: list, position: int | None = None) -> list:
+    where = "" if position is None else f" at position {position}"
+    if not embedding:
+        raise ValueError(f"Embedding response is empty{where}.")
+    if len(embedding) != EMBEDDING_DIM:
+        raise ValueError(
+            f"Unexpected embedding length{where}: {len(embedding)}. Expected {EMBEDDING_DIM}."
+        )
+    return embedding
+
+
+def embed(txt: str, client: Optional[OpenAI] = None) -> list:
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(txt, embedding_model, EMBEDDING_DIM)
+        if cached is not None:
+            return cached
+
+    response = (client or resources.openai_sync()).embeddings.create(
         input=[txt],
         model=embedding_model,
-        dimensions=1024,
+        dimensions=EMBEDDING_DIM,
     )
-    embedding = response.data[0].embedding
-    if not embedding:
-        raise ValueError("Embedding response is empty.")
-    if len(embedding) != 1024:
+    embedding = _check_vector(response.data[0].embedding)
+    if cache is not None:
+        cache.put(txt, embedding, embedding_model, EMBEDDING_DIM)
+    return embedding
+
+
+async def aembed(txt: str, client: Optional[AsyncOpenAI] = None) -> list:
+    """
+    Async twin of `embed()` for the request path; shares the same cache.
+    Only the in-memory tier is read on the event loop; SQLite reads and
+    writes run in a worker thread.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get_memory(txt, embedding_model, EMBEDDING_DIM)
+        if cached is None:
+            cached = await asyncio.to_thread(cache.get, txt, embedding_model, EMBEDDING_DIM)
+        if cached is not None:
+            return cached
+
+    async def fetch() -> list:
+        response = await (client or resources.openai()).embeddings.create(
+            input=[txt],
+            model=embedding_model,
+            dimensions=EMBEDDING_DIM,
+        )
+        embedding = _check_vector(response.data[0].embedding)
+        if cache is not None:
+            await asyncio.to_thread(cache.put, txt, embedding, embedding_model, EMBEDDING_DIM)
+        return embedding
+
+    # concurrent requests for the same text share one API call
+    return await embed_flight.do((txt, embedding_model), fetch)
+
+
+def estimate_tokens(txt: str) -> int:
+    """Cheap, conservative token estimate (~3 chars per token) used for packing."""
+    return len(txt) // 3 + 1
+
+
+def _batches(texts: list[str], max_tokens: int, max_items: int) -> list[list[int]]:
+    """Greedily pack input positions into batches under both budgets."""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, txt in enumerate(texts):
+        cost = estimate_tokens(txt)
+        if cost > MAX_INPUT_TOKENS:
+            raise ValueError(
+                f"Input {i} is too long to embed (~{cost} tokens, limit {MAX_INPUT_TOKENS})."
+            )
+        if current and (used + cost > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(batch: list[str], client: OpenAI) -> list[list]:
+    response = client.embeddings.create(
+        input=batch,
+        model=embedding_model,
+        dimensions=EMBEDDING_DIM,
+    )
+    return _batch_vectors(response, batch)
+
+
+async def _aembed_batch(batch: list[str], client: AsyncOpenAI) -> list[list]:
+    response = await client.embeddings.create(
+        input=batch,
+        model=embedding_model,
+        dimensions=EMBEDDING_DIM,
+    )
+    return _batch_vectors(response, batch)
+
+
+def _batch_vectors(response, batch: list[str]) -> list[list]:
+    if len(response.data) != len(batch):
         raise ValueError(
-            f"Unexpected embedding length: {len(embedding)}. Expected 1024."
+            f"Embedding response has {len(response.data)} vectors for {len(batch)} inputs."
         )
-    return embedding
\ No newline at end of file
+    # The API tags every vector with the position of its input; never trust list order.
+    vectors: list = [None] * len(batch)
+    for item in response.data:
+        if not 0 <= item.index < len(batch) or vectors[item.index] is not None:
+            raise ValueError(f"Embedding response has unexpected index {item.index}.")
+        vectors[item.index] = _check_vector(item.embedding, item.index)
+    return vectors
+
+
+def _plan(texts: list[str]) -> tuple[list, list[str]]:
+    """Cached vectors in input order (None where missing) and the unique texts still to embed."""
+    if any(not t for t in texts):
+        raise ValueError("Cannot embed an empty string.")
+    cache = get_cache()
+    results: list = (
+        cache.get_many(texts, embedding_model, EMBEDDING_DIM) if cache is not None
+        else [None] * len(texts)
+    )
+    pending = list(dict.fromkeys(t for t, v in zip(texts, results) if v is None))
+    return results, pending
+
+
+def _merge(texts: list[str], results: list, fresh: dict[str, list]) -> list[list]:
+    cache = get_cache()
+    if cache is not None and fresh:
+        cache.put_many(list(fresh), list(fresh.values()), embedding_model, EMBEDDING_DIM)
+    return [v if v is not None else fresh[t] for t, v in zip(texts, results)]
+
+
+def embed_many(
+    texts: list[str],
+    client: Optional[OpenAI] = None,
+    max_tokens: int = EMBED_BATCH_TOKENS,
+    max_items: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+) -> list[list]:
+    """
+    Embed many texts with as few requests as possible.
+    Cached vectors are served locally; the remaining unique texts are packed
+    into token-budgeted batches that run concurrently. Vectors are returned
+    in input order.
+    """
+    if not texts:
+        return []
+    results, pending = _plan(texts)
+    if not pending:
+        return results
+
+    batches = _batches(pending, max_tokens, max_items)
+    logger.info(
+        "Embedding %d texts in %d request(s) (%d served from cache)",
+        len(pending), len(batches), len(texts) - sum(v is None for v in results),
+    )
+
+    client = client or resources.openai_sync()
+
+    def run(positions: list[int]) -> list[list]:
+        return _embed_batch([pending[i] for i in positions], client)
+
+    fresh: dict[str, list] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        for positions, vectors in zip(batches, pool.map(run, batches)):
+            for i, vector in zip(positions, vectors):
+                fresh[pending[i]] = vector
+
+    return _merge(texts, results, fresh)
+
+
+async def aembed_many(
+    texts: list[str],
+    client: Optional[AsyncOpenAI] = None,
+    max_tokens: int = EMBED_BATCH_TOKENS,
+    max_items: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+) -> list[list]:
+    """Async twin of `embed_many()` for the request path (cache I/O in a worker thread)."""
+    if not texts:
+        return []
+    results, pending = await asyncio.to_thread(_plan, texts)
+    if not pending:
+        return results
+
+    batches = _batches(pending, max_tokens, max_items)
+    logger.info(
+        "Embedding %d texts in %d request(s) (%d served from cache)",
+        len(pending), len(batches), len(texts) - sum(v is None for v in results),
+    )
+    client = client or resources.openai()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(positions: list[int]) -> list[list]:
+        async with semaphore:
+            return await _aembed_batch([pending[i] for i in positions], client)
+
+    fresh: dict[str, list] = {}
+    for positions, vectors in zip(batches, await asyncio.gather(*(run(b) for b in batches))):
+        for i, vector in zip(positions, vectors):
+            fresh[pending[i]] = vector
+
+    return await asyncio.to_thread(_merge, texts, results, fresh)
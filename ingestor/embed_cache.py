@@ -0,0 +1,208 @@
+"""
+Persistent, content-addressed cache for embedding vectors.
+
+Vectors are keyed by (model, dimensions, sha256(text)) and stored as packed
+float32 blobs in a SQLite database running in WAL mode, so any number of
+uvicorn workers and the ingestor can read it concurrently while one writes.
+A small in-process LRU sits in front of the database. Reads only write back
+`last_used` when it is more than EMBED_CACHE_TOUCH_S old, so hot entries do
+not put every lookup behind the WAL writer lock.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_PATH        = os.getenv(
+    "EMBED_CACHE_PATH", os.path.join(os.path.dirname(__file__), "embed_cache.sqlite")
+)
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+EMBED_CACHE_LRU_SIZE    = int(os.getenv("EMBED_CACHE_LRU_SIZE", "2048"))
+EMBED_CACHE_TOUCH_S     = float(os.getenv("EMBED_CACHE_TOUCH_S", "3600"))   # last_used granularity
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key       TEXT PRIMARY KEY,
+    model     TEXT NOT NULL,
+    dims      INTEGER NOT NULL,
+    vector    BLOB NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def cache_key(text: str, model: str, dims: int) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{dims}:{digest}"
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU → SQLite) vector cache with hit/miss counters."""
+
+    def __init__(
+        self,
+        path: str = EMBED_CACHE_PATH,
+        max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+        lru_size: int = EMBED_CACHE_LRU_SIZE,
+        touch_s: float = EMBED_CACHE_TOUCH_S,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.touch_s = touch_s
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()          # SQLite connection
+        self._lru_lock = threading.Lock()      # memory tier only; never held across I/O
+        self._writes_since_trim = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._db.commit()
+
+    # ── lookups ────────────────────────────────────────────────────────
+    def get_many(self, texts: list[str], model: str, dims: int) -> list[list | None]:
+        """Return cached vectors in input order (None for misses)."""
+        keys = [cache_key(t, model, dims) for t in texts]
+        found: dict[str, list] = {}
+        with self._lru_lock:
+            missing = []
+            for k in keys:
+                if k in self._lru:
+                    self._lru.move_to_end(k)
+                    found[k] = self._lru[k]
+                else:
+                    missing.append(k)
+
+        now = time.time()
+        stale: list[str] = []
+        with self._lock:
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector, last_used FROM embeddings "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for k, blob, last_used in rows:
+                    vector = array("f", blob).tolist()
+                    found[k] = vector
+                    self._remember(k, vector)
+                    if now - last_used > self.touch_s:
+                        stale.append(k)
+            if stale:
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in stale],
+                )
+                self._db.commit()
+
+        out = [found.get(k) for k in keys]
+        hits = sum(v is not None for v in out)
+        with self._lru_lock:                   # counters are shared with get_memory()
+            self.hits += hits
+            self.misses += len(out) - hits
+        return out
+
+    def get(self, text: str, model: str, dims: int) -> list | None:
+        return self.get_many([text], model, dims)[0]
+
+    def get_memory(self, text: str, model: str, dims: int) -> list | None:
+        """Memory-tier lookup only: safe to call on the event loop. A miss is not counted."""
+        k = cache_key(text, model, dims)
+        with self._lru_lock:
+            vector = self._lru.get(k)
+            if vector is not None:
+                self._lru.move_to_end(k)
+                self.hits += 1
+        return vector
+
+    # ── writes ─────────────────────────────────────────────────────────
+    def put_many(self, texts: list[str], vectors: list[list], model: str, dims: int) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                k = cache_key(text, model, dims)
+                self._remember(k, vector)
+                rows.append((k, model, dims, array("f", vector).tobytes(), now))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dims, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            self._writes_since_trim += len(rows)
+            if self._writes_since_trim >= max(1, self.max_entries // 100):
+                self._trim()
+
+    def put(self, text: str, vector: list, model: str, dims: int) -> None:
+        self.put_many([text], [vector], model, dims)
+
+    # ── housekeeping ───────────────────────────────────────────────────
+    def _remember(self, key: str, vector: list) -> None:
+        with self._lru_lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _trim(self) -> None:
+        """Evict least-recently-used rows once the table exceeds the cap."""
+        self._writes_since_trim = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._db.commit()
+            logger.info("Embedding cache evicted %d entries", excess)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache | None:
+    """Return the process-wide cache, or None when EMBED_CACHE_PATH is empty."""
+    global _cache
+    if not EMBED_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def opened_cache() -> EmbeddingCache | None:
+    """The process-wide cache if something already opened it; never touches the disk."""
+    return _cache
@@ -1,4 +1,6 @@
 # standard-library
+import argparse
+import hashlib
 import json
 import logging
 import os
@@ -7,28 +9,31 @@ from functools import lru_cache
 # third-party
 import pandas as pd
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import BadRequestError, OpenAI
 from yfinance import Ticker
 import weaviate
 from weaviate.classes.config import Configure, DataType, Property
-from weaviate.classes.data import DataObject
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
 
 # local
 from agent_service.theme_taxonomy import THEMES
-from .embed import embed  # your local embedding helper
+from agent_service.resources import resources
+from .embed import embed_many  # your local embedding helper
+from .pipeline import Pipeline, Stage
+from .doc_store import has_vector, list_summary, load_docs, write_store
+from .theme_centroids import write_theme_centroids
+from .writer import StreamingWriter
+from .corpus_version import publish as publish_corpus_version
 
 #
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-# OpenAI helper
-@lru_cache(maxsize=1)
+# OpenAI helper: the pooled client shared with embed.py
 def _get_client() -> OpenAI:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not set")
-    return OpenAI(api_key=api_key)
+    return resources.openai_sync()
 
 def enrich_text(description: str) -> tuple[str, list[str], list[str]]:
     """
@@ -55,95 +60,295 @@ def enrich_text(description: str) -> tuple[str, list[str], list[str]]:
     themes   = [t for t in data.get("themes", []) if t in THEMES][:7]
     return summary, keywords, themes
 
-# Weaviate connection
-client = weaviate.connect_to_local() 
+# Weaviate connection, opened on first use rather than at import
 COLLECTION_NAME = os.getenv("WEAVIATE_COLLECTION")
 
-if not client.collections.exists(COLLECTION_NAME):
-    raise RuntimeError(f"Collection {COLLECTION_NAME} does not exist")
+@lru_cache(maxsize=1)
+def _get_weaviate() -> weaviate.WeaviateClient:
+    return weaviate.connect_to_local()
+
+@lru_cache(maxsize=1)
+def get_collection():
+    client = _get_weaviate()
+    if not client.collections.exists(COLLECTION_NAME):
+        raise RuntimeError(f"Collection {COLLECTION_NAME} does not exist")
+    return client.collections.get(COLLECTION_NAME)
+
+def close_clients() -> None:
+    if _get_weaviate.cache_info().currsize:
+        _get_weaviate().close()
+    resources.close_sync()
 
-collection = client.collections.get(COLLECTION_NAME)
+# pipeline tuning: workers / requests-per-second per stage
+FETCH_WORKERS  = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+FETCH_RPS      = float(os.getenv("INGEST_FETCH_RPS", "5"))
+ENRICH_WORKERS = int(os.getenv("INGEST_ENRICH_WORKERS", "8"))
+ENRICH_RPS     = float(os.getenv("INGEST_ENRICH_RPS", "3"))
+EMBED_WORKERS  = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+EMBED_BATCH    = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+QUEUE_SIZE     = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
 
 # helpers
+FINANCIAL_FIELDS = ("name", "sector", "country", "ebitda_musd", "rev_growth_pct", "market_cap_musd")
+
 def sanitize_key(key: str) -> str:
     return key.replace(".", "_")
 
-def build_doc(ticker: str, name: str) -> dict:
+def object_id(ticker: str) -> str:
+    """Deterministic Weaviate UUID for a ticker, so re-ingests upsert in place."""
+    return generate_uuid5(sanitize_key(ticker))
+
+def _fingerprint(value) -> str:
+    blob = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+def fingerprint_doc(doc: dict) -> dict:
+    """Stamp the source fingerprints used by delta ingestion onto `doc`."""
+    doc["_fp_description"] = _fingerprint(doc.get("description", ""))
+    doc["_fp_financials"]  = _fingerprint({k: doc.get(k) for k in FINANCIAL_FIELDS})
+    return doc
+
+def properties(doc: dict) -> dict:
     """
-    Fetch Yahoo Finance info + GPT-4o enrichment.
-    Returns a dict with `embed_text` (to be vectorized later).
+    Stored Weaviate properties: everything except private `_` keys and embed_text.
+    An empty summary is stored as the truncated description, so list views never
+    need to fetch `description`.
+    """
+    props = {k: v for k, v in doc.items() if not k.startswith("_") and k != "embed_text"}
+    if "summary" in props or props.get("description"):
+        props["summary"] = list_summary(doc)
+    return props
+
+def market_properties(info: dict) -> dict:
+    """
+    Yahoo Finance `info` → the market-data properties (shared with ingestor.market_data).
+    Yahoo sends explicit nulls for fields it lacks; they map like missing ones.
+    """
+    return {
+        "sector":          info.get("sector") or "Unknown",
+        "country":         info.get("country") or "Unknown",
+        "ebitda_musd":     round((info.get("ebitda") or 0) / 1e6, 1),
+        "rev_growth_pct":  round((info.get("revenueGrowth") or 0) * 100, 0),
+        "market_cap_musd": round((info.get("marketCap") or 0) / 1e6, 1),
+    }
+
+def fetch_doc(ticker: str, name: str) -> dict:
+    """
+    Fetch Yahoo Finance info and map it onto the stored properties.
     """
     yf   = Ticker(ticker)
     info = yf.info
-    about = info.get("longBusinessSummary", "")
 
+    return fingerprint_doc({
+        "ticker":          sanitize_key(ticker),
+        "name":            name,
+        **market_properties(info),
+        "description":     info.get("longBusinessSummary", ""),
+    })
+
+def enrich_doc(doc: dict) -> dict:
+    """
+    Add GPT-4o enrichment to a fetched doc.
+    Adds `embed_text` (to be vectorized later). Docs that already carry
+    enrichment (reused by delta ingestion) are passed through untouched.
+    """
+    if "summary" in doc:
+        return doc
+
+    about = doc["description"]
     try:
         summary, keywords, themes = enrich_text(about) if about else ("", [], [])
-    except Exception as e:
-        logger.warning("OpenAI enrichment failed for %s: %s", ticker, e)
+    except (BadRequestError, json.JSONDecodeError) as e:
+        # the input itself is the problem; rate limits / outages were already
+        # retried by the shared limiter and fail the ticker instead
+        logger.warning("OpenAI enrichment failed for %s: %s", doc["ticker"], e)
         summary, keywords, themes = "", [], []
 
     #embed_text = " | ".join(filter(None, [summary, " ".join(keywords), " ".join(themes)]))
     embed_text = " | ".join(filter(None, [summary, " ".join(keywords)]))
-    
-    return {
-        "ticker":          sanitize_key(ticker),
-        "name":            name,
-        "sector":          info.get("sector", "Unknown"),
-        "country":         info.get("country", "Unknown"),
-        "ebitda_musd":     round(info.get("ebitda", 0) / 1e6, 1),
-        "rev_growth_pct":  round(info.get("revenueGrowth", 0) * 100, 0),
-        "market_cap_musd": round(info.get("marketCap", 0) / 1e6, 1),
-        "description":     about,
-        "summary":         summary,
-        "keywords":        keywords,
-        "themes":          themes,
-        "embed_text":      embed_text  # will be turned into a vector below
-    }
 
-# main ingest routine
-if __name__ == "__main__":
-    cache_file = os.path.join(os.path.dirname(__file__), "my_docs.json")
+    doc.update(
+        summary=summary,
+        keywords=keywords,
+        themes=themes,
+        embed_text=embed_text,     # will be turned into a vector below
+    )
+    return doc
 
-    if not os.path.exists(cache_file):
-        data_path = os.path.join(os.path.dirname(__file__), "data", "sample_companies.csv")
-        df = pd.read_csv(data_path)
-        df["ticker"] = df["ticker"].apply(lambda x: x.split(":")[1])
+def build_doc(ticker: str, name: str) -> dict:
+    """
+    Fetch Yahoo Finance info + GPT-4o enrichment.
+    Returns a dict with `embed_text` (to be vectorized later).
+    """
+    return enrich_doc(fetch_doc(ticker, name))
 
-        docs = [build_doc(row["ticker"], row["company"]) for _, row in df.iterrows()]
-        with open(cache_file, "w") as f:
-            json.dump(docs, f, indent=2)
-        logger.info("Saved %d documents to %s", len(docs), cache_file)
-    else:
-        with open(cache_file, "r") as f:
-            docs = json.load(f)
-
-    # create embeddings & payloads
-    payloads: list[DataObject] = []
-    for d in docs:
-        if not d["embed_text"]:
-            logger.warning("Skipping %s – no text to embed", d["ticker"])
-            continue
-
-        vector = embed(d["embed_text"])           # ← your local embed() returns list[float]
-        d.pop("embed_text")                       # not stored in Weaviate
-
-        payloads.append(
-            DataObject(
-                properties=d,
-                vector=vector
+def embed_docs(docs: list[dict]) -> list[dict]:
+    """Attach `_vector` to every doc that has text to embed (one batched call)."""
+    todo = [d for d in docs if d.get("embed_text") and not has_vector(d)]
+    for d, vector in zip(todo, embed_many([d["embed_text"] for d in todo])):
+        d["_vector"] = vector
+    return docs
+
+def reuse_previous(previous: dict[str, dict]):
+    """
+    Delta stage: when a company's description is unchanged, carry over its
+    enrichment and vector so the enrich/embed stages skip it. Every doc is
+    tagged with `_change` in {"new", "description", "financials", "unchanged"}.
+    """
+    def stage(doc: dict) -> dict:
+        old = previous.get(doc["ticker"])
+        if old is None:
+            doc["_change"] = "new"
+        elif (old.get("_fp_description") != doc["_fp_description"]
+              or not has_vector(old) or "summary" not in old):
+            doc["_change"] = "description"
+        else:
+            for k in ("summary", "keywords", "themes", "embed_text", "_vector"):
+                if k in old:
+                    doc[k] = old[k]
+            doc["_change"] = (
+                "financials" if old.get("_fp_financials") != doc["_fp_financials"] else "unchanged"
             )
+        return doc
+    return stage
+
+def needs_upsert(doc: dict) -> bool:
+    """
+    New, re-embedded and financial-only changes are all written through the
+    batcher; financial-only docs carry their previous vector, so the object
+    is replaced whole without re-embedding.
+    """
+    return has_vector(doc) and doc.get("_change", "new") != "unchanged"
+
+def add_to_writer(writer: StreamingWriter, doc: dict) -> None:
+    writer.add(properties(doc), vector=doc["_vector"], uuid=object_id(doc["ticker"]))
+
+def run_pipeline(
+    companies: list[tuple[str, str]],
+    previous: dict[str, dict] | None = None,
+    writer: StreamingWriter | None = None,
+) -> tuple[list[dict], list[str]]:
+    """
+    Fetch → enrich → embed → write over (ticker, name) pairs with bounded
+    queues between stages. With `previous` docs (keyed by ticker), unchanged
+    descriptions reuse their enrichment and vector. With a `writer`, every
+    changed object is streamed to Weaviate as it comes out.
+    Returns (docs in input order, tickers that failed).
+    """
+    written: dict[str, dict] = {}
+
+    def write(doc: dict) -> dict:
+        if writer is not None and needs_upsert(doc):
+            add_to_writer(writer, doc)
+        written[doc["ticker"]] = doc
+        return doc
+
+    stages = [Stage("fetch", lambda c: fetch_doc(*c), workers=FETCH_WORKERS, rps=FETCH_RPS)]
+    if previous is not None:
+        stages.append(Stage("diff", reuse_previous(previous)))
+    stages += [
+        Stage("enrich", enrich_doc, workers=ENRICH_WORKERS, rps=ENRICH_RPS),
+        Stage("embed",  embed_docs, workers=EMBED_WORKERS, batch_size=EMBED_BATCH),
+        Stage("write",  write),
+    ]
+
+    pipeline = Pipeline(stages, queue_size=QUEUE_SIZE)
+    _, failures, _ = pipeline.run((ticker, (ticker, name)) for ticker, name in companies)
+    if failures:
+        logger.warning("%d ticker(s) failed: %s", len(failures),
+                       ", ".join(f"{f.key} ({f.stage})" for f in failures))
+
+    docs = [written[sanitize_key(t)] for t, _ in companies if sanitize_key(t) in written]
+    return docs, [sanitize_key(f.key) for f in failures]
+
+def load_universe() -> list[tuple[str, str]]:
+    data_path = os.path.join(os.path.dirname(__file__), "data", "sample_companies.csv")
+    df = pd.read_csv(data_path)
+    df["ticker"] = df["ticker"].apply(lambda x: x.split(":")[1])
+    return list(zip(df["ticker"], df["company"]))
+
+def upsert(docs: list[dict]) -> None:
+    """Stream objects into Weaviate under their deterministic ticker UUIDs."""
+    with StreamingWriter(get_collection()) as writer:
+        for d in docs:
+            if not has_vector(d):
+                logger.warning("Skipping %s – no text to embed", d["ticker"])
+                continue
+            add_to_writer(writer, d)
+
+def apply_delta(docs: list[dict], removed: list[str]) -> None:
+    """
+    Push the deletes of a delta; every changed object was already streamed
+    by the pipeline. A description that changed to something with nothing to
+    embed takes its old object with it: a full ingest would not store it
+    either, and the old one still carries the previous text.
+    """
+    changed = [d for d in docs if d["_change"] in ("new", "description") and has_vector(d)]
+    emptied = [d["ticker"] for d in docs if d["_change"] == "description" and not has_vector(d)]
+
+    stale = removed + emptied
+    if stale:
+        get_collection().data.delete_many(
+            where=Filter.by_id().contains_any([object_id(t) for t in stale])
         )
 
-    if payloads:
-        try:
-            collection.data.insert_many(payloads)
-            logger.info("Inserted %d objects", len(payloads))
-        except weaviate.exceptions.WeaviateInsertManyAllFailedError as e:
-            logger.error("Upload failed: %s", e)
-            for idx, err in enumerate(e.errors):
-                logger.error("Error %d:\n%s", idx, json.dumps(err, indent=2))
+    logger.info(
+        "Delta: %d upserted, %d financial updates, %d unchanged, %d deleted (%d emptied)",
+        len(changed), sum(d["_change"] == "financials" for d in docs),
+        sum(d["_change"] == "unchanged" for d in docs), len(stale), len(emptied),
+    )
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingest companies into Weaviate")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Refresh against the saved docs: re-enrich/re-embed only changed "
+             "descriptions, update financials in place and delete removed tickers",
+    )
+    return parser.parse_args()
+
+# main ingest routine
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.delta:
+        previous = {d["ticker"]: d if "_fp_description" in d else fingerprint_doc(d)
+                    for d in load_docs()}
+
+        universe = load_universe()
+        with StreamingWriter(get_collection()) as writer:
+            docs, failed = run_pipeline(universe, previous, writer)
+        current = {sanitize_key(t) for t, _ in universe}
+        removed = [t for t in previous if t not in current]
+
+        # a transient fetch failure must not look like a removal
+        docs += [previous[t] | {"_change": "unchanged"} for t in failed if t in previous]
+        apply_delta(docs, removed)
+
+        docs = [{k: v for k, v in d.items() if k != "_change"} for d in docs]
+        write_store(docs)
+
     else:
-        raise RuntimeError("No valid payloads to upload")
+        docs = load_docs()
+        if not docs:
+            with StreamingWriter(get_collection()) as writer:
+                docs, _ = run_pipeline(load_universe(), writer=writer)
+        else:
+            # older caches may hold text without vectors
+            embed_docs(docs)
+            upsert(docs)
+        write_store(docs)
+
+        if not any(has_vector(d) for d in docs):
+            raise RuntimeError("No valid payloads to upload")
 
-    client.close()
\ No newline at end of file
+    # lets the agent service drop results cached against the previous corpus
+    logger.info("Published corpus version %s", publish_corpus_version(get_collection()))
+
+    # the resolver reloads on the file's mtime; a failure keeps the previous centroids
+    try:
+        write_theme_centroids(docs)
+    except Exception:
+        logger.exception("Building theme centroids failed; keeping the previous ones")
+    close_clients()
\ No newline at end of file
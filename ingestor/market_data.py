@@ -0,0 +1,255 @@
+"""
+Market-data refresh, decoupled from enrichment and embedding.
+
+`python -m ingestor.ingest` ties sector / country / EBITDA / growth / market
+cap to a full fetch → GPT-4o → embed run. This module keeps just those
+properties fresh, cheaply:
+
+  • fundamentals – raw Yahoo Finance `info` payloads in an on-disk SQLite
+                   cache (WAL, like the embedding cache); only entries older
+                   than MARKET_INFO_TTL_S are refetched, through the
+                   ingest pipeline's rate-limited workers
+  • quotes       – one bulk `yfinance.download` for every ticker; market cap
+                   is re-priced as shares outstanding × last close, so it
+                   moves daily even while fundamentals come from the cache
+  • writes       – changed properties only, as partial `data.update`s on the
+                   existing Weaviate objects (vectors untouched), mirrored
+                   into the doc store; the corpus version is republished so
+                   the agent service drops stale cached results
+
+New tickers still need a full ingest; they are skipped here.
+
+    python -m ingestor.market_data refresh                 # once
+    python -m ingestor.market_data refresh --every 900     # on its own schedule
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import yfinance
+from yfinance import Ticker
+
+from .corpus_version import publish as publish_corpus_version
+from .doc_store import load_docs, write_store
+from .ingest import (
+    FETCH_RPS, FETCH_WORKERS, QUEUE_SIZE,
+    close_clients, fingerprint_doc, get_collection, load_universe,
+    market_properties, object_id, sanitize_key,
+)
+from .pipeline import Pipeline, Stage
+
+logger = logging.getLogger(__name__)
+
+MARKET_INFO_CACHE_PATH = os.getenv(
+    "MARKET_INFO_CACHE_PATH", os.path.join(os.path.dirname(__file__), "market_info.sqlite")
+)
+MARKET_INFO_TTL_S      = float(os.getenv("MARKET_INFO_TTL_S", str(24 * 3600)))
+MARKET_QUOTE_PERIOD    = os.getenv("MARKET_QUOTE_PERIOD", "5d")     # covers weekends / holidays
+MARKET_UPDATE_WORKERS  = int(os.getenv("MARKET_UPDATE_WORKERS", "8"))
+
+MARKET_FIELDS = ("sector", "country", "ebitda_musd", "rev_growth_pct", "market_cap_musd")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    ticker     TEXT PRIMARY KEY,
+    payload    TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+)
+"""
+
+
+class InfoCache:
+    """Raw `Ticker.info` payloads keyed by Yahoo symbol, with their fetch time."""
+
+    def __init__(self, path: str = MARKET_INFO_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+
+    def get_many(self, tickers: list[str], max_age_s: float = MARKET_INFO_TTL_S) -> dict[str, dict]:
+        """Payloads fetched within `max_age_s`; stale or missing tickers are left out."""
+        cutoff = time.time() - max_age_s
+        found: dict[str, dict] = {}
+        with self._lock:
+            for i in range(0, len(tickers), 500):   # stay under SQLite's variable limit
+                chunk = tickers[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT ticker, payload FROM info WHERE fetched_at >= ? "
+                    f"AND ticker IN ({','.join('?' * len(chunk))})",
+                    (cutoff, *chunk),
+                ).fetchall()
+                found.update((t, json.loads(p)) for t, p in rows)
+        return found
+
+    def put(self, ticker: str, info: dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO info (ticker, payload, fetched_at) VALUES (?, ?, ?)",
+                (ticker, json.dumps(info, default=str), time.time()),
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ── fetching ──────────────────────────────────────────────────────────────
+def fetch_infos(tickers: list[str], cache: InfoCache, max_age_s: float = MARKET_INFO_TTL_S) -> dict[str, dict]:
+    """`info` for every ticker: fresh cache entries, the rest fetched in parallel and cached."""
+    infos = cache.get_many(tickers, max_age_s)
+    missing = [t for t in tickers if t not in infos]
+    logger.info("Market info: %d cached, %d to fetch", len(infos), len(missing))
+    if not missing:
+        return infos
+
+    def fetch(ticker: str) -> dict:
+        info = Ticker(ticker).info
+        if not info:
+            raise ValueError("empty info payload")
+        cache.put(ticker, info)
+        return info
+
+    pipeline = Pipeline(
+        [Stage("fetch", fetch, workers=FETCH_WORKERS, rps=FETCH_RPS)], queue_size=QUEUE_SIZE,
+    )
+    results, failures, _ = pipeline.run((t, t) for t in missing)
+    if failures:
+        logger.warning("Market info failed for %d ticker(s): %s",
+                       len(failures), ", ".join(str(f.key) for f in failures))
+    infos.update(results)
+    return infos
+
+
+def fetch_closes(tickers: list[str]) -> dict[str, float]:
+    """Last close per ticker from one bulk quote download (tickers without a quote are left out)."""
+    if not tickers:
+        return {}
+    frame = yfinance.download(
+        tickers, period=MARKET_QUOTE_PERIOD, interval="1d",
+        group_by="column", auto_adjust=False, progress=False, threads=True,
+    )
+    if frame is None or frame.empty:
+        return {}
+    closes = frame["Close"].ffill().iloc[-1]
+    return {t: float(v) for t, v in closes.items() if v is not None and not math.isnan(v)}
+
+
+def reprice(info: dict, close: Optional[float]) -> dict:
+    """`info` with marketCap at `close` (shares outstanding × price), when both are known."""
+    shares = info.get("sharesOutstanding") or info.get("impliedSharesOutstanding")
+    if close is None or not shares:
+        return info
+    return {**info, "marketCap": shares * close}
+
+
+# ── refresh ───────────────────────────────────────────────────────────────
+def diff_properties(old: dict, new: dict) -> dict:
+    return {k: new[k] for k in MARKET_FIELDS if k in new and old.get(k) != new[k]}
+
+
+def refresh(
+    universe: list[tuple[str, str]],
+    max_age_s: float = MARKET_INFO_TTL_S,
+    dry_run: bool = False,
+) -> dict[str, dict]:
+    """
+    Refresh the market-data properties of every already-ingested company in
+    `universe`. Returns {ticker: changed properties}.
+    """
+    docs = load_docs()
+    stored = {d["ticker"]: d for d in docs}
+    tickers = [t for t, _ in universe if sanitize_key(t) in stored]
+    skipped = len(universe) - len(tickers)
+    if skipped:
+        logger.info("Skipping %d ticker(s) not ingested yet", skipped)
+
+    cache = InfoCache()
+    try:
+        infos = fetch_infos(tickers, cache, max_age_s)
+    finally:
+        cache.close()
+    closes = fetch_closes(tickers)
+
+    changes: dict[str, dict] = {}
+    for ticker in tickers:
+        info = infos.get(ticker)
+        if info is None:
+            continue
+        key = sanitize_key(ticker)
+        try:
+            props = market_properties(reprice(info, closes.get(ticker)))
+        except (TypeError, ValueError) as exc:
+            # one malformed payload must not abort the whole refresh
+            logger.warning("Skipping %s: unusable market info (%s)", ticker, exc)
+            continue
+        changed = diff_properties(stored[key], props)
+        if changed:
+            changes[key] = changed
+    logger.info("Market data: %d of %d companies changed (%d quotes)", len(changes), len(tickers), len(closes))
+    if dry_run or not changes:
+        return changes
+
+    def update(item: tuple[str, dict]) -> str:
+        key, props = item
+        # vector untouched: PATCH the properties of the existing object
+        get_collection().data.update(uuid=object_id(key), properties=props)
+        return key
+
+    pipeline = Pipeline([Stage("update", update, workers=MARKET_UPDATE_WORKERS)], queue_size=QUEUE_SIZE)
+    _, failures, _ = pipeline.run((key, (key, props)) for key, props in changes.items())
+    for f in failures:
+        changes.pop(f.key, None)      # keep the store in step with Weaviate
+
+    for key, props in changes.items():
+        stored[key].update(props)
+        fingerprint_doc(stored[key])
+    write_store(docs)
+    logger.info("Published corpus version %s", publish_corpus_version(get_collection()))
+    return changes
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Market-data refresh (no enrichment, no re-embedding)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ref = sub.add_parser("refresh", help="Update sector, country and financials of ingested companies")
+    ref.add_argument("--max-age", type=float, default=MARKET_INFO_TTL_S,
+                     help="Refetch cached fundamentals older than this many seconds (0 = always)")
+    ref.add_argument("--every", type=float, default=0,
+                     help="Repeat every N seconds instead of running once")
+    ref.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    refresh(load_universe(), args.max_age, args.dry_run)
+                except Exception:
+                    if not args.every:
+                        raise
+                    logger.exception("Market-data refresh failed; retrying next round")
+                if not args.every:
+                    break
+                time.sleep(max(0.0, args.every - (time.monotonic() - started)))
+        finally:
+            close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Small threaded stage pipeline used by the ingestor.
+
+Items flow through a chain of stages connected by bounded queues. Every
+stage has its own worker count and requests-per-second budget, so slow
+upstream calls (Yahoo Finance, GPT-4o, embeddings) overlap instead of
+adding up. A failing item is recorded and dropped; it never blocks the
+rest of the batch.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class RateLimiter:
+    """Thread-safe token bucket; `rps <= 0` disables limiting."""
+
+    def __init__(self, rps: float, burst: Optional[float] = None):
+        self.rps = rps
+        self.capacity = burst if burst is not None else max(1.0, rps)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rps <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rps)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rps
+            time.sleep(wait)
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step.
+
+    `fn` maps a payload to a new payload. When `batch_size > 1` it instead
+    receives a list of payloads and must return a list of the same length;
+    a failing batch is retried item by item so one bad input only fails itself.
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    rps: float = 0.0
+    batch_size: int = 1
+
+
+@dataclass
+class StageStats:
+    name: str
+    processed: int = 0
+    failed: int = 0
+    busy_s: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    finished: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_s": round(self.busy_s, 2),
+            "items_per_s": round(self.throughput, 2),
+        }
+
+
+@dataclass
+class Failure:
+    key: Any
+    stage: str
+    error: str
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], queue_size: int = 64):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage.")
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, items: Iterable[tuple[Any, Any]]) -> tuple[list[tuple[Any, Any]], list[Failure], list[dict]]:
+        """
+        Push `(key, payload)` items through every stage.
+        Returns `(results, failures, per-stage stats)`; results keep their keys
+        but not necessarily their input order.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        stats = [StageStats(s.name) for s in self.stages]
+        failures: list[Failure] = []
+        lock = threading.Lock()
+        remaining = [s.workers for s in self.stages]
+
+        def record_failure(i: int, key: Any, exc: Exception) -> None:
+            logger.warning("Stage %s failed for %s: %s", self.stages[i].name, key, exc)
+            with lock:
+                stats[i].failed += 1
+                failures.append(Failure(key, self.stages[i].name, repr(exc)))
+
+        def call(i: int, key: Any, payload: Any) -> None:
+            stage, limiter = self.stages[i], limiters[i]
+            limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                out = stage.fn([payload])[0] if stage.batch_size > 1 else stage.fn(payload)
+            except Exception as exc:
+                record_failure(i, key, exc)
+                return
+            finally:
+                with lock:
+                    stats[i].busy_s += time.monotonic() - t0
+            with lock:
+                stats[i].processed += 1
+            queues[i + 1].put((key, out))
+
+        def take_batch(q: queue.Queue, size: int) -> tuple[list, bool]:
+            first = q.get()
+            if first is _DONE:
+                return [], True
+            batch = [first]
+            while len(batch) < size:
+                try:
+                    item = q.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    return batch, True
+                batch.append(item)
+            return batch, False
+
+        def worker(i: int) -> None:
+            stage, limiter = self.stages[i], limiters[i]
+            q_in = queues[i]
+            try:
+                while True:
+                    if stage.batch_size > 1:
+                        batch, done = take_batch(q_in, stage.batch_size)
+                        if batch:
+                            limiter.acquire()
+                            t0 = time.monotonic()
+                            try:
+                                outs = stage.fn([p for _, p in batch])
+                                if len(outs) != len(batch):
+                                    raise ValueError("batch stage returned wrong number of results")
+                            except Exception as exc:
+                                logger.warning("Stage %s batch failed (%s); retrying items one by one",
+                                               stage.name, exc)
+                                with lock:
+                                    stats[i].busy_s += time.monotonic() - t0
+                                for key, payload in batch:
+                                    call(i, key, payload)
+                            else:
+                                with lock:
+                                    stats[i].busy_s += time.monotonic() - t0
+                                    stats[i].processed += len(batch)
+                                for (key, _), out in zip(batch, outs):
+                                    queues[i + 1].put((key, out))
+                        if done:
+                            break
+                    else:
+                        item = q_in.get()
+                        if item is _DONE:
+                            break
+                        call(i, *item)
+            finally:
+                with lock:
+                    remaining[i] -= 1
+                    last = remaining[i] == 0
+                    if last:
+                        stats[i].finished = time.monotonic()
+                # the end-of-input marker is passed along: to sibling workers
+                # first, then to the next stage once this one is drained
+                (queues[i + 1] if last else q_in).put(_DONE)
+
+        limiters = [RateLimiter(s.rps) for s in self.stages]
+        threads = [
+            threading.Thread(target=worker, args=(i,), name=f"{s.name}-{w}", daemon=True)
+            for i, s in enumerate(self.stages)
+            for w in range(s.workers)
+        ]
+        for t in threads:
+            t.start()
+
+        results: list[tuple[Any, Any]] = []
+
+        def drain() -> None:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    return
+                results.append(item)
+
+        collector = threading.Thread(target=drain, name="collector", daemon=True)
+        collector.start()
+
+        for item in items:
+            queues[0].put(item)            # blocks when the first stage falls behind
+        queues[0].put(_DONE)
+
+        for t in threads:
+            t.join()
+        collector.join()
+
+        report = [s.as_dict() for s in stats]
+        for row in report:
+            logger.info("Stage %(stage)s: %(processed)d ok, %(failed)d failed, "
+                        "%(busy_s).1fs busy, %(items_per_s).2f items/s", row)
+        return results, failures, report
@@ -0,0 +1,111 @@
+"""
+Precomputed theme vectors, stored next to the doc store.
+
+For every theme in `THEMES` and every parent in `PARENT_THEME`:
+
+  • a label vector – the embedding of the theme name (with its parent, or
+    for a parent the names of its child themes);
+  • a member centroid – the mean unit vector of the companies tagged with
+    the theme (themes only; zero when no company carries it).
+
+The agent service uses them to pick a theme for a query locally instead of
+asking the user to clarify. Written as `themes.npz` inside the store
+directory after every ingest, or rebuilt from an existing store:
+
+    python -m ingestor.theme_centroids build
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from agent_service.theme_taxonomy import PARENT_THEME, THEMES
+from .doc_store import DOC_STORE_PATH, EMBEDDING_DIM, VECTOR_KEY, has_vector, load_docs
+
+logger = logging.getLogger(__name__)
+
+THEMES_FILE = "themes.npz"
+
+
+def theme_path(store_path: str = DOC_STORE_PATH) -> str:
+    return os.path.join(store_path, THEMES_FILE)
+
+
+def label_texts() -> tuple[list[str], list[str], list[str]]:
+    """(names, kinds, texts to embed) for every theme, then every parent."""
+    parents = list(dict.fromkeys(PARENT_THEME[t] for t in THEMES))
+    names = list(THEMES) + parents
+    kinds = ["theme"] * len(THEMES) + ["parent"] * len(parents)
+    texts = [f"{t} ({PARENT_THEME[t]})" for t in THEMES] + [
+        f"{p}: " + ", ".join(t for t in THEMES if PARENT_THEME[t] == p) for p in parents
+    ]
+    return names, kinds, texts
+
+
+def member_centroids(docs: list[dict], names: list[str], dim: int = EMBEDDING_DIM) -> tuple[np.ndarray, np.ndarray]:
+    """Mean unit vector and member count per theme name (parents aggregate their children)."""
+    sums = np.zeros((len(names), dim), dtype=np.float64)
+    counts = np.zeros(len(names), dtype=np.int64)
+    position = {n: i for i, n in enumerate(names)}
+    for d in docs:
+        if not has_vector(d):
+            continue
+        v = np.asarray(d[VECTOR_KEY], dtype=np.float64)
+        v /= np.linalg.norm(v) or 1.0
+        tagged = {t for t in d.get("themes") or [] if t in position}
+        for name in tagged | {PARENT_THEME[t] for t in tagged if t in PARENT_THEME}:
+            sums[position[name]] += v
+            counts[position[name]] += 1
+    centroids = sums / np.maximum(counts, 1)[:, None]
+    return centroids.astype(np.float32), counts
+
+
+def write_theme_centroids(docs: list[dict], store_path: str = DOC_STORE_PATH) -> str:
+    from .embed import embed_many, embedding_model     # needs OPENAI_API_KEY; keep import lazy
+
+    names, kinds, texts = label_texts()
+    labels = np.asarray(embed_many(texts), dtype=np.float32)
+    members, counts = member_centroids(docs, names, labels.shape[1])
+
+    os.makedirs(store_path, exist_ok=True)
+    path = theme_path(store_path)
+    fd, tmp = tempfile.mkstemp(prefix=".themes-", suffix=".npz", dir=store_path)
+    os.close(fd)
+    try:
+        np.savez(
+            tmp,
+            names=np.array(names), kinds=np.array(kinds),
+            labels=labels, members=members, member_counts=counts,
+            model=np.array(embedding_model),
+        )
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    logger.info(
+        "Wrote %d theme vectors (%d with members) to %s",
+        len(names), int((counts[: len(THEMES)] > 0).sum()), path,
+    )
+    return path
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Theme vector utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Embed the theme taxonomy and compute member centroids")
+    build.add_argument("store_path", nargs="?", default=DOC_STORE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        write_theme_centroids(load_docs(args.store_path), args.store_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Streaming Weaviate writer.
+
+Objects are handed to the client's batcher as they are produced instead of
+being collected into one `insert_many` payload, so memory stays flat and the
+batcher's bounded buffer pushes back on producers. Failed objects are retried
+with exponential backoff; whatever still fails is appended to a JSONL
+dead-letter file that can be replayed later.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODE           = os.getenv("INGEST_WRITE_MODE", "fixed")      # "fixed" | "dynamic"
+WRITE_BATCH_SIZE     = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "100"))
+WRITE_CONCURRENCY    = int(os.getenv("INGEST_WRITE_CONCURRENCY", "2"))
+WRITE_MAX_RETRIES    = int(os.getenv("INGEST_WRITE_MAX_RETRIES", "3"))
+WRITE_BACKOFF_S      = float(os.getenv("INGEST_WRITE_BACKOFF_S", "1.0"))
+DEAD_LETTER_PATH     = os.getenv(
+    "INGEST_DEAD_LETTER_PATH", os.path.join(os.path.dirname(__file__), "dead_letter.jsonl")
+)
+REPORT_EVERY         = 1000
+
+
+class StreamingWriter:
+    """
+    Context manager around `collection.batch`:
+
+        with StreamingWriter(collection) as writer:
+            for doc in docs:
+                writer.add(properties, vector, uuid)
+        writer.stats()  # written / failed / objects_per_s
+    """
+
+    def __init__(
+        self,
+        collection,
+        mode: str = WRITE_MODE,
+        batch_size: int = WRITE_BATCH_SIZE,
+        concurrent_requests: int = WRITE_CONCURRENCY,
+        max_retries: int = WRITE_MAX_RETRIES,
+        backoff_s: float = WRITE_BACKOFF_S,
+        dead_letter_path: Optional[str] = DEAD_LETTER_PATH,
+    ):
+        if mode not in ("fixed", "dynamic"):
+            raise ValueError(f"Unknown write mode {mode!r}; use 'fixed' or 'dynamic'.")
+        self.collection = collection
+        self.mode = mode
+        self.batch_size = batch_size
+        self.concurrent_requests = concurrent_requests
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.dead_letter_path = dead_letter_path
+
+        self.added = 0
+        self.failed = 0
+        self.retried = 0
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._ctx = None
+        self._batch = None
+        self._lock = threading.Lock()
+
+    # ── batching ───────────────────────────────────────────────────────
+    def _open(self):
+        if self.mode == "dynamic":
+            return self.collection.batch.dynamic()
+        return self.collection.batch.fixed_size(
+            batch_size=self.batch_size, concurrent_requests=self.concurrent_requests
+        )
+
+    def __enter__(self) -> "StreamingWriter":
+        self._started = time.monotonic()
+        self._ctx = self._open()
+        self._batch = self._ctx.__enter__()
+        return self
+
+    def add(self, properties: dict, vector: Any = None, uuid: Any = None) -> None:
+        """Queue one object; blocks while the batcher's buffer is full."""
+        with self._lock:
+            self._batch.add_object(properties=properties, vector=vector, uuid=uuid)
+            self.added += 1
+            if self.added % REPORT_EVERY == 0:
+                logger.info("Queued %d objects (%.1f objects/s)", self.added, self._rate(self.added))
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self._ctx.__exit__(exc_type, exc, tb)
+        finally:
+            failed = list(self.collection.batch.failed_objects)
+            self._batch = self._ctx = None
+            # retries only on a clean exit; failures are never dropped silently
+            if exc_type is None:
+                failed = self._retry(failed)
+            self._dead_letter(failed)
+        self.failed = len(failed)
+        self._elapsed = time.monotonic() - self._started
+        logger.info(
+            "Wrote %d/%d objects in %.1fs (%.1f objects/s, %d retried, %d dead-lettered)",
+            self.added - self.failed, self.added, self._elapsed,
+            self._rate(self.added - self.failed), self.retried, self.failed,
+        )
+
+    # ── failure handling ───────────────────────────────────────────────
+    def _retry(self, failed: list) -> list:
+        for attempt in range(1, self.max_retries + 1):
+            if not failed:
+                break
+            delay = self.backoff_s * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.warning("Retrying %d failed objects in %.1fs (attempt %d/%d): %s",
+                           len(failed), delay, attempt, self.max_retries, failed[0].message)
+            time.sleep(delay)
+            self.retried += len(failed)
+            with self._open() as batch:
+                for err in failed:
+                    obj = err.object_
+                    batch.add_object(properties=obj.properties, vector=obj.vector, uuid=obj.uuid)
+            failed = list(self.collection.batch.failed_objects)
+        return failed
+
+    def _dead_letter(self, failed: list) -> None:
+        if not failed:
+            return
+        if not self.dead_letter_path:
+            logger.error("Dropping %d objects that failed permanently", len(failed))
+            return
+        with open(self.dead_letter_path, "a") as f:
+            for err in failed:
+                obj = err.object_
+                f.write(json.dumps({
+                    "uuid": str(obj.uuid) if obj.uuid else None,
+                    "properties": obj.properties,
+                    "vector": obj.vector,
+                    "error": err.message,
+                }) + "\n")
+        logger.error("Wrote %d permanently failed objects to %s", len(failed), self.dead_letter_path)
+
+    # ── reporting ──────────────────────────────────────────────────────
+    def _rate(self, n: int) -> float:
+        elapsed = self._elapsed or (time.monotonic() - self._started)
+        return n / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "written": self.added - self.failed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "objects_per_s": round(self._rate(self.added - self.failed), 1),
+        }
@@ -0,0 +1,31 @@
+import asyncio
+
+from agent_service.graph import theme_resolver
+from agent_service.graph.fast_parser import fast_parse
+from agent_service.graph.nodes import clarifier
+
+PARENT_ONLY_QUERY = "cybersecurity companies in the US"
+
+
+def test_parent_only_parse_falls_back_to_llm_without_theme_vectors(tmp_path, monkeypatch):
+    # a deployment that has not re-ingested yet: no themes.npz
+    monkeypatch.setattr(theme_resolver, "theme_path", lambda store_path: str(tmp_path / "themes.npz"))
+    monkeypatch.setattr(theme_resolver, "_resolver", None)
+    monkeypatch.setattr(theme_resolver, "_mtime", None)
+    monkeypatch.setattr(theme_resolver, "_checked", 0.0)
+
+    fast = fast_parse(PARENT_ONLY_QUERY)
+    assert fast.accepted and fast.structured["theme"] is None
+
+    llm = {**fast.structured, "theme": "Cloud & Network Security / SASE"}
+    calls = []
+
+    async def extract(user_query):
+        calls.append(user_query)
+        return llm
+
+    monkeypatch.setattr(clarifier, "_extract", extract)
+    structured = asyncio.run(clarifier._parse(PARENT_ONLY_QUERY, "test-no-themes"))
+
+    assert calls == [PARENT_ONLY_QUERY]
+    assert structured["theme"] == llm["theme"]
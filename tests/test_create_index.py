@@ -0,0 +1,18 @@
+import json
+
+from index_setup import create_index
+
+
+def test_corpus_rows_reads_the_doc_store_index(tmp_path):
+    assert create_index.corpus_rows(str(tmp_path)) is None
+    (tmp_path / "index.json").write_text(json.dumps({"dim": 4, "tickers": {f"T{i}": i for i in range(20000)}}))
+    assert create_index.corpus_rows(str(tmp_path)) == 20000
+
+
+def test_flat_search_cutoff_default_covers_selective_filters(monkeypatch):
+    monkeypatch.setattr(create_index, "FLAT_SEARCH_MIN", 500)
+    monkeypatch.setattr(create_index, "FLAT_SEARCH_SHARE", 0.1)
+    # never below the retriever's exact-search threshold, even before the first ingest
+    assert create_index.default_flat_search_cutoff(None) == 500
+    assert create_index.default_flat_search_cutoff(3000) == 500
+    assert create_index.default_flat_search_cutoff(20000) == 2000
@@ -1,4 +1,5 @@
 import os
+import json
 import requests
 import streamlit as st
 
@@ -62,6 +63,163 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 API_URL = os.getenv("AGENT_SERVICE_URL", "http://agent-service")
 
+STREAMING = os.getenv("UI_STREAMING", "true").lower() == "true"
+
+
+def render_user(text):
+    st.markdown(
+        f"""
+        <div style="background-color:#e6f2ff; padding:12px 18px; border-radius:8px; font-size:16px; margin-bottom:20px;">
+          <strong>{text}</strong>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+def render_matches_header():
+    st.subheader("Top matches for your query")
+    st.markdown(
+        "<p style='font-size: 13px; color: gray; margin-top: -10px;'>"
+        "Ranked by relevance using vector + filter-based search"
+        "</p>",
+        unsafe_allow_html=True
+    )
+
+
+def render_doc(doc):
+    if doc.get("_relevance", 0.0) <= 0.001:
+        return
+    with st.container(border=True):
+        # ─── TOP ROW: Name + Score ───
+        name_col, score_col = st.columns([6, 1])
+        with name_col:
+            st.markdown(f"## {doc.get('name','Unknown')} ({doc.get('ticker','-')})")
+
+        # ── inside the per-doc loop ──────────────────────────────────────────────
+        with score_col:
+            # _relevance is already a 0–1 score (higher is better)
+            score = doc.get("_relevance", 0.0)          # no inversion
+            score_col.markdown(
+                f"""
+                <div style="text-align: right;">
+                <div style="font-size:0.85em; color:#6c757d; margin-bottom:0.3em;">
+                    Relevance&nbsp;Score
+                </div>
+                <div style="font-size:2em; font-weight:600; line-height:1;">
+                    {score:.2f}
+                </div>
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+
+        # ─── SECOND ROW: Sector/Country/Themes | Financials | (empty) ───
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            st.markdown(f"**Sector**: {doc.get('sector','-')}")
+            st.markdown(f"**Country**: {doc.get('country','-')}")
+            themes = doc.get("themes", [])
+            if themes:
+                st.markdown(f"**Services**: {', '.join(themes)}")
+        with col2:
+            st.markdown(f"**Market Cap**: ${doc.get('market_cap_musd',0)/1000:,.1f} B")
+            st.markdown(f"**EBITDA**: ${doc.get('ebitda_musd',0)/1000:,.1f} B")
+            st.markdown(f"**Revenue Growth**: {doc.get('rev_growth_pct',0):.0f}%")
+        # col3 left empty for spacing
+
+        # ─── FULL‑WIDTH SUMMARY BELOW ───
+        summary_text = doc.get("summary") or doc.get("description", "")
+        if summary_text:
+            with st.expander("Summary"):
+                st.write(summary_text)
+    st.markdown("<div style='margin-bottom:2rem;'></div>", unsafe_allow_html=True)
+
+
+def render_agent(content):
+    if isinstance(content, dict):
+        logger.info("Agent response: %s", content)
+        docs = content.get("retrieved_docs", [])
+        if not docs:
+            st.subheader("No companies match your query")
+        else:
+            render_matches_header()
+            for doc in docs:
+                render_doc(doc)
+
+
+def describe_query(q):
+    """One-line summary of the parsed StructuredQuery."""
+    parts = []
+    if q.get("theme"):
+        parts.append(f"**Theme**: {q['theme']}")
+    if q.get("country"):
+        parts.append(f"**Country**: {q['country']}")
+    for field, label in (("ebitda_min", "EBITDA"), ("market_cap_min", "Market Cap"), ("rev_growth_min", "Growth")):
+        if q.get(field):
+            parts.append(f"**{label}** > {q[field]:,.0f}")
+    if q.get("keyword_query"):
+        parts.append(f"**Keywords**: {q['keyword_query']}")
+    return " · ".join(parts) or "No criteria recognised"
+
+
+def sse_events(response):
+    """Yield (event, payload) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
+
+
+def stream_query(query):
+    """Render the agent's answer piece by piece from /query/stream; return it for the history."""
+    result = {"retrieved_docs": []}
+    status = st.empty()
+    status.caption("Understanding your query…")
+    try:
+        with requests.post(f"{API_URL}/query/stream", json={"query": query}, stream=True) as response:
+            if not response.ok:
+                return {"error": response.text}
+            for event, payload in sse_events(response):
+                if event == "parsed":
+                    result.update(payload)
+                    status.caption(describe_query(payload.get("structured_query") or {}) + " — searching…")
+                elif event == "filters":
+                    result["structured_query"] = payload["structured_query"]
+                    status.caption(describe_query(payload["structured_query"]))
+                elif event == "company":
+                    if not result["retrieved_docs"]:
+                        render_matches_header()
+                    result["retrieved_docs"].append(payload["doc"])
+                    render_doc(payload["doc"])
+                elif event == "done":
+                    result.update(payload)
+                elif event == "error":
+                    result["error"] = payload.get("detail")
+    except Exception as exc:
+        result["error"] = str(exc)
+
+    if result.get("error") and not result["retrieved_docs"]:
+        st.error(result["error"])
+    elif not result["retrieved_docs"] and not result.get("need_clarification"):
+        st.subheader("No companies match your query")
+    return result
+
+
+def post_query(query):
+    try:
+        response = requests.post(f"{API_URL}/query", json={"query": query})
+        return response.json() if response.ok else {"error": response.text}
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
 st.subheader("AI Screening Agent - What companies are you looking for?")
 
 if "history" not in st.session_state:
@@ -69,6 +227,13 @@ if "history" not in st.session_state:
 if "full_query" not in st.session_state:
     st.session_state.full_query = ""
 
+for role, content in st.session_state.history:
+    with st.chat_message(role):
+        if role == "user":
+            render_user(content)
+        else:
+            render_agent(content)
+
 user_input = st.chat_input("Enter your query")
 
 if user_input:
@@ -77,93 +242,27 @@ if user_input:
     else:
         st.session_state.full_query = user_input
 
-    try:
-        response = requests.post(f"{API_URL}/query", json={"query": st.session_state.full_query})
-        data = response.json() if response.ok else {"error": response.text}
-    except Exception as exc:
-        data = {"error": str(exc)}
+    with st.chat_message("user"):
+        render_user(user_input)
+    with st.chat_message("agent"):
+        if STREAMING:
+            data = stream_query(st.session_state.full_query)
+        else:
+            data = post_query(st.session_state.full_query)
+            render_agent(data)
 
     st.session_state.history.append(("user", user_input))
     st.session_state.history.append(("agent", data))
 
     if data.get("need_clarification"):
-        st.info("The agent needs more information. Please clarify your query.")
+        suggestions = data.get("theme_suggestions") or []
+        if suggestions:
+            st.info("Which theme did you mean: " + ", ".join(f"**{t}**" for t in suggestions) + "?")
+        else:
+            st.info("The agent needs more information. Please clarify your query.")
     else:
         st.session_state.full_query = ""
 
-for role, content in st.session_state.history:
-    with st.chat_message(role):
-        if role == "user":
-            st.markdown(
-                f"""
-                <div style="background-color:#e6f2ff; padding:12px 18px; border-radius:8px; font-size:16px; margin-bottom:20px;">
-                  <strong>{user_input}</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-        else:
-            if isinstance(content, dict):
-                logger.info("Agent response: %s", content)
-                docs = content.get("retrieved_docs", [])
-                if not docs:
-                    st.subheader("No companies match your query")
-                else:
-                    st.subheader("Top matches for your query")
-                    st.markdown(
-                        "<p style='font-size: 13px; color: gray; margin-top: -10px;'>"
-                        "Ranked by relevance using vector + filter-based search"
-                        "</p>",
-                        unsafe_allow_html=True
-                    )
-                    for doc in docs:
-                        if doc.get("_relevance", 0.0) > 0.001:
-                            with st.container(border=True):
-                                # ─── TOP ROW: Name + Score ───
-                                name_col, score_col = st.columns([6, 1])
-                                with name_col:
-                                    st.markdown(f"## {doc.get('name','Unknown')} ({doc.get('ticker','-')})")
-                                
-                                # ── inside the per-doc loop ──────────────────────────────────────────────
-                                with score_col:
-                                    # _relevance is already a 0–1 score (higher is better)
-                                    score = doc.get("_relevance", 0.0)          # no inversion
-                                    score_col.markdown(
-                                        f"""
-                                        <div style="text-align: right;">
-                                        <div style="font-size:0.85em; color:#6c757d; margin-bottom:0.3em;">
-                                            Relevance&nbsp;Score
-                                        </div>
-                                        <div style="font-size:2em; font-weight:600; line-height:1;">
-                                            {score:.2f}
-                                        </div>
-                                        </div>
-                                        """,
-                                        unsafe_allow_html=True
-                                    )
-
-                                # ─── SECOND ROW: Sector/Country/Themes | Financials | (empty) ───
-                                col1, col2, col3 = st.columns([3, 2, 1])
-                                with col1:
-                                    st.markdown(f"**Sector**: {doc.get('sector','-')}")
-                                    st.markdown(f"**Country**: {doc.get('country','-')}")
-                                    themes = doc.get("themes", [])
-                                    if themes:
-                                        st.markdown(f"**Services**: {', '.join(themes)}")
-                                with col2:
-                                    st.markdown(f"**Market Cap**: ${doc.get('market_cap_musd',0)/1000:,.1f} B")
-                                    st.markdown(f"**EBITDA**: ${doc.get('ebitda_musd',0)/1000:,.1f} B")
-                                    st.markdown(f"**Revenue Growth**: {doc.get('rev_growth_pct',0):.0f}%")
-                                # col3 left empty for spacing
-
-                                # ─── FULL‑WIDTH SUMMARY BELOW ───
-                                summary_text = doc.get("summary") or doc.get("description", "")
-                                if summary_text:
-                                    #st.markdown("<br/>", unsafe_allow_html=True)
-                                    with st.expander("Summary"):
-                                        st.write(summary_text)
-                            st.markdown("<div style='margin-bottom:2rem;'></div>", unsafe_allow_html=True)
-
 st.markdown(
     "<hr style='margin-top:40px; margin-bottom:5px;'>"
     "<p style='text-align:center; font-size:12px; color:gray;'>"